@@ -1,6 +1,7 @@
 """
 Configuration settings for the Image Harvest Service.
 """
+import os
 
 # Geocoding service configuration
 GEOCODING_SERVICE = "apple"  # "apple" or "nominatim"
@@ -9,6 +10,17 @@ GEOCODING_SERVICE = "apple"  # "apple" or "nominatim"
 NOMINATIM_URL = "https://nominatim.openstreetmap.org"  # Base URL for Nominatim service
 NOMINATIM_USER_AGENT = "VideoAIPlatform/1.0 (image-harvest-service)"  # Required by Nominatim ToS
 NOMINATIM_RATE_LIMIT = 1  # Rate limit in seconds for Nominatim API
+NOMINATIM_TIMEOUT = 10  # Request timeout in seconds for Nominatim API
+NOMINATIM_MAX_RETRIES = 3  # Retries for throttled (429) and 5xx responses, backing off 1s, 2s, 4s
+
+# Reverse geocoding cache settings
+REVERSE_GEOCODE_CACHE_SIZE = 10000  # entries
+REVERSE_GEOCODE_CACHE_TTL = 86400   # seconds
+COORDINATE_CACHE_DECIMALS = 5       # lat/lng rounding for cache keys (~1 m)
+
+# Forward geocoding cache settings
+GEOCODE_CACHE_SIZE = 4096  # entries
+GEOCODE_CACHE_TTL = 86400  # seconds
 
 # Location settings
 MAX_DISTANCE = 50  # Maximum distance in meters to search for panoramas
@@ -17,12 +29,22 @@ MAX_DISTANCE = 50  # Maximum distance in meters to search for panoramas
 BOUNDARY_CENTER_THRESHOLD = 75  # meters - threshold for center-only search
 BOUNDARY_ADJACENT_THRESHOLD = 50  # meters - threshold for including adjacent tiles
 MAX_ADAPTIVE_TILES = 5  # maximum tiles to search in adaptive mode
+TILE_FETCH_MAX_WORKERS = 8  # concurrent coverage tile requests
+COVERAGE_TILE_CACHE_SIZE = 2048  # coverage tiles kept in memory
+COVERAGE_TILE_CACHE_TTL = 3600  # seconds before a cached tile is re-fetched
+
+# Download settings
+MAX_CONCURRENT_DOWNLOADS = 8  # panoramas downloaded in parallel across requests
+IMAGE_CONVERSION_WORKERS = os.cpu_count() or 1  # processes for HEIC -> JPEG conversion
+FACE_DOWNLOAD_MAX_WORKERS = 16  # concurrent face downloads across all panoramas
 
 # Output settings
 OUTPUT_DIR = "output"  # Directory for storing downloaded images
 
 # Image settings
 FACE_ZOOM_LEVEL = 2  # Zoom level for panorama faces (0-4, higher is more detailed)
+# Faces are intermediate artifacts: baseline JPEG, no Huffman optimization pass, 4:2:0 chroma
+JPEG_SAVE_OPTIONS = {"quality": 75, "optimize": False, "progressive": False, "subsampling": 2}
 
 # Route-specific settings
 ROUTE_HEADING_SECTOR_DEGREES = 60
@@ -30,10 +52,19 @@ ROUTE_MAX_PANORAMAS = 50
 ROUTE_PROXIMITY_THRESHOLD = 100  # meters
 ROUTE_CONFIDENCE_THRESHOLD = 4   # points
 ROUTE_SEARCH_RADIUS = 200        # meters
+ROUTE_MAX_CANDIDATES = 10        # nearest unvisited panoramas considered per step
 ROUTE_PROGRESSION_THRESHOLD = 10 # meters
 ROUTE_MAX_AMBIGUOUS_SKIPS = 2    # times
+ROUTE_MAX_AMBIGUITY_LOOKUPS = 3  # reverse geocodes per ambiguous step (closest-to-end first)
+# When True, ambiguous steps don't block on uncached reverse geocodes: the lookups are queued and
+# the best-scored candidate is taken at once, so the street name only decides later steps at the
+# same spots (from cache). Off by default because that can change which panoramas a route picks
+ROUTE_BACKGROUND_STREET_LOOKUPS = False
+ROUTE_DOWNLOAD_LOOKAHEAD = 3     # route panorama downloads in flight while later steps are selected
 
 # Logging settings
-LOG_LEVEL = "INFO"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # e.g. WARNING in production skips per-item log formatting
 LOG_DIR = "logs"
-LOG_SESSION_FORMAT = "image_harvest_{timestamp}.txt"  # .txt suffix 
\ No newline at end of file
+LOG_SESSION_FORMAT = "image_harvest_{timestamp}.txt"  # .txt suffix 
+LOG_FILE_MAX_BYTES = 50_000_000  # rotate the session log file at this size
+LOG_FILE_BACKUP_COUNT = 5
\ No newline at end of file
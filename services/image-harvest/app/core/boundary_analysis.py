@@ -2,14 +2,91 @@
 Boundary Analysis Module - Calculates tile boundary proximity and determines optimal search strategy.
 """
 import logging
+from functools import lru_cache
 from typing import Dict, List, Tuple, Any
 from streetlevel import geo
 import math
-from app.core.utils import calculate_distance
+from app.core.utils import EARTH_RADIUS_M
 from app.config import BOUNDARY_CENTER_THRESHOLD, BOUNDARY_ADJACENT_THRESHOLD, MAX_ADAPTIVE_TILES
 
 logger = logging.getLogger(__name__)
 
+# Zoom level of the Look Around coverage tiles
+TILE_ZOOM = 17
+
+# Strategy for each 4-bit mask of close boundaries (N=8, S=4, E=2, W=1)
+_STRATEGY_BY_MASK = (
+    "center-only",       # 0b0000
+    "single-direction",  # 0b0001 W
+    "single-direction",  # 0b0010 E
+    "multi-direction",   # 0b0011 E+W
+    "single-direction",  # 0b0100 S
+    "corner",            # 0b0101 S+W
+    "corner",            # 0b0110 S+E
+    "multi-direction",   # 0b0111
+    "single-direction",  # 0b1000 N
+    "corner",            # 0b1001 N+W
+    "corner",            # 0b1010 N+E
+    "multi-direction",   # 0b1011
+    "multi-direction",   # 0b1100 N+S
+    "multi-direction",   # 0b1101
+    "multi-direction",   # 0b1110
+    "multi-direction",   # 0b1111
+)
+
+# Adjacent tile offsets (dx, dy) for each close-boundary mask. Tile y grows southward,
+# so north is (0, -1); corner masks also include the diagonal tile
+_OFFSETS_BY_MASK = (
+    (),                                 # 0b0000
+    ((-1, 0),),                         # 0b0001 W
+    ((1, 0),),                          # 0b0010 E
+    ((1, 0), (-1, 0)),                  # 0b0011 E+W
+    ((0, 1),),                          # 0b0100 S
+    ((0, 1), (-1, 0), (-1, 1)),         # 0b0101 S+W
+    ((0, 1), (1, 0), (1, 1)),           # 0b0110 S+E
+    ((0, 1), (1, 0), (-1, 0)),          # 0b0111
+    ((0, -1),),                         # 0b1000 N
+    ((0, -1), (-1, 0), (-1, -1)),       # 0b1001 N+W
+    ((0, -1), (1, 0), (1, -1)),         # 0b1010 N+E
+    ((0, -1), (1, 0), (-1, 0)),         # 0b1011
+    ((0, -1), (0, 1)),                  # 0b1100 N+S
+    ((0, -1), (0, 1), (-1, 0)),         # 0b1101
+    ((0, -1), (0, 1), (1, 0)),          # 0b1110
+    ((0, -1), (0, 1), (1, 0), (-1, 0)), # 0b1111
+)
+
+# Tile offsets to search for each mask: the center tile first, then its neighbours.
+# The offsets are already unique, so only the MAX_ADAPTIVE_TILES cap is applied
+_TILES_BY_MASK = tuple(
+    (((0, 0),) + offsets)[:MAX_ADAPTIVE_TILES] for offsets in _OFFSETS_BY_MASK
+)
+
+def _close_boundary_mask(boundary_distances: Dict[str, float], threshold: float = BOUNDARY_ADJACENT_THRESHOLD) -> int:
+    """
+    Pack the boundaries closer than BOUNDARY_ADJACENT_THRESHOLD into a 4-bit mask (N=8, S=4, E=2, W=1).
+    
+    The threshold is bound as a default argument so the comparisons read a local, not a module global.
+    """
+    return (
+        (boundary_distances["north"] < threshold) << 3
+        | (boundary_distances["south"] < threshold) << 2
+        | (boundary_distances["east"] < threshold) << 1
+        | (boundary_distances["west"] < threshold)
+    )
+
+@lru_cache(maxsize=4096)
+def _tile_corners(tile_x: int, tile_y: int) -> Tuple[float, float, float, float]:
+    """
+    Return (nw_lat, nw_lon, se_lat, se_lon) for a coverage tile.
+    
+    Route points cluster in a handful of tiles, so the corners are cached per tile.
+    """
+    # Northwest corner of the tile
+    nw_lat, nw_lon = geo.tile_coord_to_wgs84(tile_x, tile_y, TILE_ZOOM)
+    # Southeast corner of the tile
+    se_lat, se_lon = geo.tile_coord_to_wgs84(tile_x + 1, tile_y + 1, TILE_ZOOM)
+    return nw_lat, nw_lon, se_lat, se_lon
+
 def calculate_boundary_distances(target_lat: float, target_lon: float) -> Dict[str, float]:
     """
     Calculate distance from target coordinates to each boundary of the center tile.
@@ -23,26 +100,27 @@ def calculate_boundary_distances(target_lat: float, target_lon: float) -> Dict[s
     """
     try:
         # Calculate center tile coordinates
-        center_x, center_y = geo.wgs84_to_tile_coord(target_lat, target_lon, 17)
+        center_x, center_y = geo.wgs84_to_tile_coord(target_lat, target_lon, TILE_ZOOM)
+        
+        # Calculate tile boundary coordinates (northwest and southeast corners)
+        nw_lat, nw_lon, se_lat, se_lon = _tile_corners(center_x, center_y)
         
-        # Calculate tile boundary coordinates
-        # Northwest corner of the tile
-        nw_lat, nw_lon = geo.tile_coord_to_wgs84(center_x, center_y, 17)
-        # Southeast corner of the tile  
-        se_lat, se_lon = geo.tile_coord_to_wgs84(center_x + 1, center_y + 1, 17)
+        # Calculate boundary distances in closed form. Each boundary shares
+        # either the target's latitude or longitude, so the Haversine formula
+        # degenerates to R*|dlat| (north/south) and R*cos(lat)*|dlon| (east/west)
+        cos_lat = math.cos(math.radians(target_lat))
         
-        # Calculate boundary distances using Haversine formula for accuracy
         # North boundary (northern edge of the tile)
-        north_distance = calculate_distance(target_lat, target_lon, nw_lat, target_lon)
+        north_distance = EARTH_RADIUS_M * math.radians(nw_lat - target_lat)
         
         # South boundary (southern edge of the tile)
-        south_distance = calculate_distance(target_lat, target_lon, se_lat, target_lon)
+        south_distance = EARTH_RADIUS_M * math.radians(target_lat - se_lat)
         
         # East boundary (eastern edge of the tile)
-        east_distance = calculate_distance(target_lat, target_lon, target_lat, se_lon)
+        east_distance = EARTH_RADIUS_M * cos_lat * math.radians(se_lon - target_lon)
         
         # West boundary (western edge of the tile)
-        west_distance = calculate_distance(target_lat, target_lon, target_lat, nw_lon)
+        west_distance = EARTH_RADIUS_M * cos_lat * math.radians(target_lon - nw_lon)
         
         boundary_distances = {
             "north": north_distance,
@@ -52,11 +130,12 @@ def calculate_boundary_distances(target_lat: float, target_lon: float) -> Dict[s
             "center_tile": (center_x, center_y)
         }
         
-        logger.debug(f"Boundary distances for ({target_lat}, {target_lon}): {boundary_distances}")
+        # Lazy %-formatting: the dict is only rendered when DEBUG is enabled
+        logger.debug("Boundary distances for (%s, %s): %s", target_lat, target_lon, boundary_distances)
         return boundary_distances
         
-    except Exception as e:
-        logger.error(f"Error calculating boundary distances: {str(e)}")
+    except Exception:
+        logger.exception("Error calculating boundary distances")
         raise
 
 def determine_search_strategy(boundary_distances: Dict[str, float]) -> str:
@@ -69,51 +148,13 @@ def determine_search_strategy(boundary_distances: Dict[str, float]) -> str:
     Returns:
         Search strategy string: 'center-only', 'single-direction', 'corner', 'multi-direction'
     """
-    try:
-        # Extract boundary distances
-        north_dist = boundary_distances["north"]
-        south_dist = boundary_distances["south"]
-        east_dist = boundary_distances["east"]
-        west_dist = boundary_distances["west"]
-        
-        # Count boundaries that are close
-        close_boundaries = []
-        if north_dist < BOUNDARY_ADJACENT_THRESHOLD:
-            close_boundaries.append("north")
-        if south_dist < BOUNDARY_ADJACENT_THRESHOLD:
-            close_boundaries.append("south")
-        if east_dist < BOUNDARY_ADJACENT_THRESHOLD:
-            close_boundaries.append("east")
-        if west_dist < BOUNDARY_ADJACENT_THRESHOLD:
-            close_boundaries.append("west")
-        
-        # Determine strategy based on number of close boundaries
-        if len(close_boundaries) == 0:
-            # All boundaries are far - use center-only search
-            strategy = "center-only"
-        elif len(close_boundaries) == 1:
-            # One boundary is close - use single direction
-            strategy = "single-direction"
-        elif len(close_boundaries) == 2:
-            # Two boundaries are close - check if they're adjacent (corner)
-            if ("north" in close_boundaries and "east" in close_boundaries) or \
-               ("north" in close_boundaries and "west" in close_boundaries) or \
-               ("south" in close_boundaries and "east" in close_boundaries) or \
-               ("south" in close_boundaries and "west" in close_boundaries):
-                strategy = "corner"
-            else:
-                strategy = "multi-direction"
-        else:
-            # Multiple boundaries are close - use multi-direction
-            strategy = "multi-direction"
-        
-        logger.info(f"Search strategy determined: {strategy} (close boundaries: {close_boundaries})")
-        return strategy
-        
-    except Exception as e:
-        logger.error(f"Error determining search strategy: {str(e)}")
-        # Fall back to center-only strategy
-        return "center-only"
+    # Classify by which boundaries are close: none, one, two adjacent (corner),
+    # or two opposite / three or more (multi-direction)
+    mask = _close_boundary_mask(boundary_distances)
+    strategy = _STRATEGY_BY_MASK[mask]
+    
+    logger.info(f"Search strategy determined: {strategy} (close boundaries N/S/E/W: {mask:04b})")
+    return strategy
 
 def select_adaptive_tiles(search_strategy: str, boundary_distances: Dict[str, float]) -> List[Tuple[int, int]]:
     """
@@ -126,87 +167,13 @@ def select_adaptive_tiles(search_strategy: str, boundary_distances: Dict[str, fl
     Returns:
         List of tile coordinates (x, y) to search
     """
-    try:
-        center_x, center_y = boundary_distances["center_tile"]
-        tiles_to_search = [(center_x, center_y)]  # Always include center tile
-        
-        if search_strategy == "center-only":
-            # Search only the center tile
-            pass
-        elif search_strategy == "single-direction":
-            # Add the closest adjacent tile
-            closest_boundary = min(
-                [("north", boundary_distances["north"]), 
-                 ("south", boundary_distances["south"]),
-                 ("east", boundary_distances["east"]), 
-                 ("west", boundary_distances["west"])],
-                key=lambda x: x[1]
-            )
-            
-            if closest_boundary[0] == "north":
-                tiles_to_search.append((center_x, center_y - 1))
-            elif closest_boundary[0] == "south":
-                tiles_to_search.append((center_x, center_y + 1))
-            elif closest_boundary[0] == "east":
-                tiles_to_search.append((center_x + 1, center_y))
-            elif closest_boundary[0] == "west":
-                tiles_to_search.append((center_x - 1, center_y))
-                
-        elif search_strategy == "corner":
-            # Add adjacent tiles for corner scenario
-            close_boundaries = []
-            if boundary_distances["north"] < BOUNDARY_ADJACENT_THRESHOLD:
-                close_boundaries.append("north")
-            if boundary_distances["south"] < BOUNDARY_ADJACENT_THRESHOLD:
-                close_boundaries.append("south")
-            if boundary_distances["east"] < BOUNDARY_ADJACENT_THRESHOLD:
-                close_boundaries.append("east")
-            if boundary_distances["west"] < BOUNDARY_ADJACENT_THRESHOLD:
-                close_boundaries.append("west")
-            
-            # Add adjacent tiles
-            for boundary in close_boundaries:
-                if boundary == "north":
-                    tiles_to_search.append((center_x, center_y - 1))
-                elif boundary == "south":
-                    tiles_to_search.append((center_x, center_y + 1))
-                elif boundary == "east":
-                    tiles_to_search.append((center_x + 1, center_y))
-                elif boundary == "west":
-                    tiles_to_search.append((center_x - 1, center_y))
-            
-            # Add corner tile if both north/south and east/west boundaries are close
-            if len(close_boundaries) >= 2:
-                if "north" in close_boundaries and "east" in close_boundaries:
-                    tiles_to_search.append((center_x + 1, center_y - 1))
-                elif "north" in close_boundaries and "west" in close_boundaries:
-                    tiles_to_search.append((center_x - 1, center_y - 1))
-                elif "south" in close_boundaries and "east" in close_boundaries:
-                    tiles_to_search.append((center_x + 1, center_y + 1))
-                elif "south" in close_boundaries and "west" in close_boundaries:
-                    tiles_to_search.append((center_x - 1, center_y + 1))
-                    
-        elif search_strategy == "multi-direction":
-            # Add multiple adjacent tiles
-            if boundary_distances["north"] < BOUNDARY_ADJACENT_THRESHOLD:
-                tiles_to_search.append((center_x, center_y - 1))
-            if boundary_distances["south"] < BOUNDARY_ADJACENT_THRESHOLD:
-                tiles_to_search.append((center_x, center_y + 1))
-            if boundary_distances["east"] < BOUNDARY_ADJACENT_THRESHOLD:
-                tiles_to_search.append((center_x + 1, center_y))
-            if boundary_distances["west"] < BOUNDARY_ADJACENT_THRESHOLD:
-                tiles_to_search.append((center_x - 1, center_y))
-        
-        # Remove duplicates and limit to maximum tiles
-        unique_tiles = list(set(tiles_to_search))
-        if len(unique_tiles) > MAX_ADAPTIVE_TILES:
-            unique_tiles = unique_tiles[:MAX_ADAPTIVE_TILES]
-        
-        logger.info(f"Selected tiles for strategy '{search_strategy}': {unique_tiles}")
-        return unique_tiles
-        
-    except Exception as e:
-        logger.error(f"Error selecting adaptive tiles: {str(e)}")
-        # Fall back to center-only
-        center_x, center_y = boundary_distances["center_tile"]
-        return [(center_x, center_y)] 
\ No newline at end of file
+    center_x, center_y = boundary_distances["center_tile"]
+    
+    # Center tile plus the adjacent (and, for corners, diagonal) tiles of each close boundary
+    tiles_to_search = [
+        (center_x + dx, center_y + dy)
+        for dx, dy in _TILES_BY_MASK[_close_boundary_mask(boundary_distances)]
+    ]
+    
+    logger.info(f"Selected tiles for strategy '{search_strategy}': {tiles_to_search}")
+    return tiles_to_search
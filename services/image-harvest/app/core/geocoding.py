@@ -1,134 +1,128 @@
-from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, NamedTuple
 import logging
 from requests import Session
-import requests  # ADD THIS IMPORT
-import io  # ADD THIS IMPORT
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import struct
+import threading
+from cachetools import TTLCache
+
+from google.protobuf.internal import api_implementation
 
 # Remove this line: from streetlevel.lookaround import Authenticator
 from ..proto import PlaceRequest_pb2, PlaceResponse_pb2, Shared_pb2
 from ..proto.PlaceRequest_pb2 import PlaceRequest
 from ..proto.Shared_pb2 import RequestType, MapsResultType
+from ..config import REVERSE_GEOCODE_CACHE_SIZE, REVERSE_GEOCODE_CACHE_TTL, COORDINATE_CACHE_DECIMALS
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-@dataclass
-class Coordinate:
+# Protobuf (de)serialization runs on every reverse geocode; the pure-Python backend is much slower
+if api_implementation.Type() == "python":
+    logger.warning("Using the pure-Python protobuf backend; use protobuf>=4.21 with PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=upb")
+
+# Reverse geocoding results keyed by (rounded lat, rounded lng, languages)
+_reverse_geocode_cache = TTLCache(maxsize=REVERSE_GEOCODE_CACHE_SIZE, ttl=REVERSE_GEOCODE_CACHE_TTL)
+_reverse_geocode_cache_lock = threading.Lock()
+
+# Shared keep-alive session for dispatcher requests, so only the first call pays the
+# DNS/TCP/TLS handshake. The reverse geocoding POST is a read, so it is safe to retry
+_SESSION = Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(["POST"]),
+    ),
+))
+
+# Plain immutable records: NamedTuple instances are cheaper to create than dataclasses
+class Coordinate(NamedTuple):
     lat: float
     lng: float  # Changed from lon to lng
 
-@dataclass
-class ValidationWarning:
+class ValidationWarning(NamedTuple):
     input_address: str
     found_address: str
     message: str
 
 # Add the ticket system (copied from lookaround-map viewer)
-@dataclass
-class TicketRequestHeader:
+class TicketRequestHeader(NamedTuple):
     version_maybe: int = 1
     locale: str = "en"
     app_identifier: str = "com.apple.geod"
     os_version: str = "11.7.5.20G1225"
     unknown: int = 60
 
-# Add these classes after the existing dataclasses
-@dataclass
-class TicketResponseHeader:
+# Add these classes after the existing records
+class TicketResponseHeader(NamedTuple):
     version_maybe: int
     unknown: int
 
-@dataclass
-class TicketResponse:
+class TicketResponse(NamedTuple):
     header: TicketResponseHeader
     payload: bytes
 
-# Add BinaryReader class after BinaryWriter
-class BinaryReader:
-    def __init__(self, base_stream: io.BytesIO):
-        self.bs = base_stream
-
-    def read(self, size: int) -> bytes:
-        return self.bs.read(size)
-
-    def read_uint2_be(self) -> int:
-        return int.from_bytes(self.bs.read(2), byteorder="big", signed=False)
-
-    def read_uint4_be(self) -> int:
-        return int.from_bytes(self.bs.read(4), byteorder="big", signed=False)
-
-
-class BinaryWriter:
-    def __init__(self, base_stream: io.BytesIO):
-        self.bs = base_stream
-
-    @property
-    def content(self) -> bytes:
-        return self.bs.getvalue()
+# Prebuilt big-endian formats for the ticket (de)serialization
+_U2 = struct.Struct(">H")
+_U4 = struct.Struct(">I")
+# Response header: version (uint16), unknown (uint32), payload length (uint32)
+_TICKET_RESPONSE_HEADER = struct.Struct(">HII")
 
-    def write(self, b: bytes):
-        self.bs.write(b)
-
-    def write_uint2_be(self, n: int):
-        self.bs.write(struct.pack(">H", n))
-
-    def write_uint4_be(self, n: int):
-        self.bs.write(struct.pack(">I", n))
-
-def _write_pascal_string_be(writer: BinaryWriter, value: str, encoding: str = "utf-8") -> None:
+def _pascal_string_be(value: str, encoding: str = "utf-8") -> bytes:
     value_bytes = value.encode(encoding)
-    writer.write_uint2_be(len(value_bytes))
-    writer.write(value_bytes)
+    return _U2.pack(len(value_bytes)) + value_bytes
 
 def serialize_ticket_request(header: TicketRequestHeader, payload: bytes) -> bytes:
-    w = BinaryWriter(io.BytesIO())
-    w.write_uint2_be(header.version_maybe)
-    _write_pascal_string_be(w, header.locale)
-    _write_pascal_string_be(w, header.app_identifier)
-    _write_pascal_string_be(w, header.os_version)
-    w.write_uint4_be(header.unknown)
-    w.write_uint4_be(len(payload))
-    w.write(payload)
-    return w.content
+    return b"".join((
+        _U2.pack(header.version_maybe),
+        _pascal_string_be(header.locale),
+        _pascal_string_be(header.app_identifier),
+        _pascal_string_be(header.os_version),
+        _U4.pack(header.unknown),
+        _U4.pack(len(payload)),
+        payload,
+    ))
 
 # Add this function after serialize_ticket_request
 def deserialize_ticket_response(response: bytes) -> TicketResponse:
     """
     Deserializes a ticket response.
     """
-    r = BinaryReader(io.BytesIO(response))
-    header = TicketResponseHeader(
-        version_maybe=r.read_uint2_be(),
-        unknown=r.read_uint4_be()
-    )
-    length = r.read_uint4_be()
-    payload = r.read(length)
-    return TicketResponse(header=header, payload=payload)
+    version_maybe, unknown, length = _TICKET_RESPONSE_HEADER.unpack_from(response)
+    start = _TICKET_RESPONSE_HEADER.size
+    header = TicketResponseHeader(version_maybe=version_maybe, unknown=unknown)
+    return TicketResponse(header=header, payload=response[start:start + length])
+
+def _ticket_response_payload(response: bytes) -> bytes:
+    """Extracts only the payload of a ticket response, without building the header record."""
+    length = _TICKET_RESPONSE_HEADER.unpack_from(response)[2]
+    start = _TICKET_RESPONSE_HEADER.size
+    return response[start:start + length]
+
+# The request header is constant, so serialize it once (everything before the payload length)
+_TICKET_REQUEST_HEADER_BYTES = serialize_ticket_request(TicketRequestHeader(), b"")[:-_U4.size]
 
 # Update the make_ticket_request function
 def make_ticket_request(payload: bytes, session: Session = None) -> bytes:
     """
     Makes a request against dispatcher.arpc with the given payload.
     """
-    header = TicketRequestHeader()
-    request_body = serialize_ticket_request(header, payload)
-    requester = session if session else requests
+    request_body = _TICKET_REQUEST_HEADER_BYTES + _U4.pack(len(payload)) + payload
+    requester = session if session else _SESSION
     http_response = requester.post("https://gsp-ssl.ls.apple.com/dispatcher.arpc", data=request_body)
-    # Change this line to properly deserialize the response
-    response_ticket = deserialize_ticket_response(http_response.content)
-    return response_ticket.payload  # Return the payload, not the raw content
+    return _ticket_response_payload(http_response.content)  # Return the payload, not the raw content
 
-def _build_pb_request(lat: float, lng: float, display_languages: List[str]) -> PlaceRequest:  # Changed from lon to lng
-    """Build protobuf request for reverse geocoding."""
+def _build_pb_request_template() -> PlaceRequest:
+    """Build the constant part of the reverse geocoding request (everything except language and location)."""
     pr = PlaceRequest()
-    pr.display_language.extend(display_languages)
     pr.client_metadata.supported_maps_result_type.append(MapsResultType.MAPS_RESULT_TYPE_PLACE)
     pr.request_type = RequestType.REQUEST_TYPE_REVERSE_GEOCODING
     pr.place_request_parameters.reverse_geocoding_parameters.preserve_original_location = True
-    pr.place_request_parameters.reverse_geocoding_parameters.extended_location.lat_lng.lat = lat
-    pr.place_request_parameters.reverse_geocoding_parameters.extended_location.lat_lng.lng = lng  # Changed from lon to lng
     pr.place_request_parameters.reverse_geocoding_parameters.extended_location.vertical_accuracy = -1
     pr.place_request_parameters.reverse_geocoding_parameters.extended_location.heading = -1
 
@@ -138,19 +132,45 @@ def _build_pb_request(lat: float, lng: float, display_languages: List[str]) -> P
     pr.request_component.append(rc)
     return pr
 
+# Built once at import; _build_pb_request copies it and fills in the per-call fields
+_PB_REQUEST_TEMPLATE = _build_pb_request_template()
+
+def _build_pb_request(lat: float, lng: float, display_languages: List[str]) -> PlaceRequest:  # Changed from lon to lng
+    """Build protobuf request for reverse geocoding."""
+    pr = PlaceRequest()
+    pr.CopyFrom(_PB_REQUEST_TEMPLATE)
+    pr.display_language.extend(display_languages)
+    lat_lng = pr.place_request_parameters.reverse_geocoding_parameters.extended_location.lat_lng
+    lat_lng.lat = lat
+    lat_lng.lng = lng  # Changed from lon to lng
+    return pr
+
+def _copy_address(address: Dict) -> Dict:
+    """Return a caller-owned copy of a cached address so the cache entry can't be mutated."""
+    return {**address, "formatted": list(address["formatted"])}
+
 def reverse_geocode(lat: float, lng: float, display_language: List[str], session: Session = None) -> Dict[str, str]:  # Changed from lon to lng
     """
     Reverse geocode coordinates using Apple Maps.
     
+    Results are cached by coordinates rounded to COORDINATE_CACHE_DECIMALS, so repeated
+    lookups of (nearly) the same location skip the network round-trip.
+    
     Args:
         lat: Latitude
         lng: Longitude  # Changed from lon to lng
         display_language: List of language codes (e.g., ["en-US"])
-        session: Optional requests session
+        session: Optional requests session (defaults to the shared pooled session)
         
     Returns:
         Dictionary containing address components
     """
+    cache_key = (round(lat, COORDINATE_CACHE_DECIMALS), round(lng, COORDINATE_CACHE_DECIMALS), tuple(display_language))
+    with _reverse_geocode_cache_lock:
+        cached = _reverse_geocode_cache.get(cache_key)
+    if cached is not None:
+        return _copy_address(cached)
+    
     try:
         # Remove this line: auth = Authenticator()  # Use the same authenticator as for panoramas
         pb_request = _build_pb_request(lat, lng, display_language)  # Changed from lon to lng
@@ -160,8 +180,8 @@ def reverse_geocode(lat: float, lng: float, display_language: List[str], session
         response.ParseFromString(pb_response)
         address = response.maps_result.place.component[0].value[0].address_object.address_object.place.address
         
-        return {
-            "formatted": list(address.formatted_address),
+        result = {
+            "formatted": tuple(address.formatted_address),
             "city": address.address_components.locality,
             "country": address.address_components.country,
             "country_code": address.address_components.country_code,
@@ -170,6 +190,11 @@ def reverse_geocode(lat: float, lng: float, display_language: List[str], session
     except Exception as e:
         logger.error(f"Error in reverse geocoding: {str(e)}")
         return None
+    
+    # Failed lookups are not cached so they are retried on the next call
+    with _reverse_geocode_cache_lock:
+        _reverse_geocode_cache[cache_key] = result
+    return _copy_address(result)
 
 from .utils import normalize_address
 
@@ -192,6 +217,10 @@ def validate_coordinates(coord: Coordinate, original_address: str) -> Optional[V
             
         formatted_apple_address = ", ".join(apple_address["formatted"])
         
+        # Identical addresses (the common case) match without normalizing
+        if original_address.lower() == formatted_apple_address.lower():
+            return None
+        
         # Normalize both addresses for comparison
         normalized_input = normalize_address(original_address)
         normalized_apple = normalize_address(formatted_apple_address)
@@ -199,8 +228,9 @@ def validate_coordinates(coord: Coordinate, original_address: str) -> Optional[V
         # Compare normalized addresses
         if normalized_input != normalized_apple:
             # Check if at least the city and state match
-            input_parts = normalized_input.split(',')
-            apple_parts = normalized_apple.split(',')
+            # (only the last two comma-separated parts are needed, so split from the right)
+            input_parts = normalized_input.rsplit(',', 2)
+            apple_parts = normalized_apple.rsplit(',', 2)
             
             # Extract city and state from both addresses (assuming they're in the last parts)
             input_location = ','.join(input_parts[-2:]) if len(input_parts) >= 2 else normalized_input
@@ -0,0 +1,89 @@
+"""
+Image Conversion Module - Decodes Look Around HEIC faces and writes them as JPEG.
+
+Kept free of service state so worker processes can import it cheaply.
+"""
+import logging
+import sys
+from PIL import Image
+from app.config import JPEG_SAVE_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+# Set up HEIC decoder
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+    HEIC_DECODER = 'pillow-heif'
+except ImportError:
+    try:
+        import pyheif
+        HEIC_DECODER = 'pyheif'
+    except ImportError:
+        try:
+            from heic2rgb import decode_heic  # type: ignore
+            HEIC_DECODER = 'heic2rgb'
+        except ImportError:
+            logger.error("No HEIC decoder found. Please install pillow-heif, pyheif, or heic2rgb")
+            sys.exit(1)
+
+def _decode_heic2rgb(heic_data: bytes) -> Image.Image:
+    # heic2rgb returns a numpy array
+    rgb_array = decode_heic(heic_data)
+    return Image.fromarray(rgb_array)
+
+def _decode_pyheif(heic_data: bytes) -> Image.Image:
+    # pyheif workflow
+    heif_file = pyheif.read(heic_data)
+    image = Image.frombytes(
+        heif_file.mode,
+        heif_file.size,
+        heif_file.data,
+        "raw",
+        heif_file.mode,
+        heif_file.stride,
+    )
+    return image
+
+def _decode_pillow_heif(heic_data: bytes) -> Image.Image:
+    # Decode straight from bytes, skipping Image.open's format probing
+    image = pillow_heif.open_heif(heic_data).to_pillow()
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+# The decoder never changes after import, so bind it once instead of branching per image
+_decode_impl = {
+    'heic2rgb': _decode_heic2rgb,
+    'pyheif': _decode_pyheif,
+    'pillow-heif': _decode_pillow_heif,
+}[HEIC_DECODER]
+
+def decode_heic_image(heic_data: bytes) -> Image.Image:
+    """
+    Decode HEIC image data using the best available decoder for the platform.
+    """
+    return _decode_impl(heic_data)
+
+def heic_bytes_to_jpeg(heic_data: bytes, jpg_path: str) -> None:
+    """
+    Decode a HEIC face and save it as JPEG.
+    
+    Takes and returns only picklable values so it can run in a ProcessPoolExecutor.
+    
+    Args:
+        heic_data: Raw HEIC bytes of one panorama face
+        jpg_path: Destination path for the JPEG
+    """
+    decode_heic_image(heic_data).save(jpg_path, "JPEG", **JPEG_SAVE_OPTIONS)
+
+def decode_face_on_demand(path: str) -> Image.Image:
+    """
+    Decode a face stored as HEIC (see keep_heic) when a consumer needs pixels.
+    
+    Args:
+        path: Path to a .heic face file
+        
+    Returns:
+        RGB PIL Image
+    """
+    with open(path, "rb") as f:
+        return decode_heic_image(f.read())
@@ -0,0 +1,79 @@
+"""
+Nominatim Module - Shared HTTP session for OpenStreetMap Nominatim lookups.
+"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.config import NOMINATIM_USER_AGENT, NOMINATIM_RATE_LIMIT, NOMINATIM_MAX_RETRIES
+
+# One keep-alive session for every forward and reverse lookup, so only the first call pays
+# the DNS/TCP/TLS handshake. The adapter only retries failed connections, which never reach
+# Nominatim; throttling and 5xx responses are retried by nominatim_get through the rate limiter.
+nominatim_session = Session()
+nominatim_session.headers.update({"User-Agent": NOMINATIM_USER_AGENT})
+nominatim_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, connect=3, read=0, status=0, other=0),
+))
+
+# Responses worth retrying: throttled (429) or a transient server error
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Monotonic time of the last request slot handed out by wait_for_rate_limit
+_last_request_ts = float("-inf")
+_rate_limit_lock = threading.Lock()
+
+def wait_for_rate_limit() -> None:
+    """
+    Block until at least NOMINATIM_RATE_LIMIT seconds have passed since the previous
+    Nominatim request. Call immediately before the request; returns at once when the
+    last one was long enough ago.
+    """
+    global _last_request_ts
+    with _rate_limit_lock:
+        delay = _last_request_ts + NOMINATIM_RATE_LIMIT - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _last_request_ts = time.monotonic()
+
+def _defer_next_request(delay: float) -> None:
+    """Push the next rate limiter slot to at least delay seconds from now, for every caller."""
+    global _last_request_ts
+    with _rate_limit_lock:
+        _last_request_ts = max(_last_request_ts, time.monotonic() + delay - NOMINATIM_RATE_LIMIT)
+
+def _retry_after_seconds(response: Response) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or an HTTP date); None if absent or invalid."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def nominatim_get(url: str, **kwargs) -> Response:
+    """
+    GET a Nominatim URL on the shared session, retrying throttled and 5xx responses.
+    Every attempt, retries included, waits for its wait_for_rate_limit() slot. Retry n
+    goes out at least NOMINATIM_RATE_LIMIT * 2**(n-1) seconds (1s, 2s, 4s) after the failed
+    response, or later when Nominatim's Retry-After asks for more; the whole process backs
+    off meanwhile. Returns the last response once it succeeds or retries are exhausted.
+    """
+    for attempt in range(NOMINATIM_MAX_RETRIES + 1):
+        wait_for_rate_limit()
+        response = nominatim_session.get(url, **kwargs)
+        if response.status_code not in _RETRY_STATUSES or attempt == NOMINATIM_MAX_RETRIES:
+            return response
+        response.close()
+        backoff = NOMINATIM_RATE_LIMIT * 2 ** attempt
+        _defer_next_request(max(backoff, _retry_after_seconds(response) or 0))
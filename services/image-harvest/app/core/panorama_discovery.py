@@ -1,14 +1,95 @@
 """
 Panorama Discovery Module - Fetches and processes panoramas from multiple tiles.
 """
+import heapq
 import logging
-from typing import List, Tuple
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+from cachetools import TTLCache
+from requests import Session
+from requests.adapters import HTTPAdapter
 from streetlevel import lookaround
 from streetlevel.lookaround import CoverageTile, LookaroundPanorama
-from app.core.utils import calculate_distance
+from app.core.utils import calculate_distance_vector, within_bounding_box
+from app.config import TILE_FETCH_MAX_WORKERS, COVERAGE_TILE_CACHE_SIZE, COVERAGE_TILE_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
+class PanoramaArrays(NamedTuple):
+    """Column (structure-of-arrays) view of a panorama list."""
+    panos: np.ndarray  # object array of LookaroundPanorama, index-aligned with lats/lons
+    lats: np.ndarray
+    lons: np.ndarray
+
+def panorama_arrays(panoramas: List[LookaroundPanorama]) -> PanoramaArrays:
+    """
+    Build contiguous coordinate columns for a list of panoramas.
+    
+    Args:
+        panoramas: List of LookaroundPanorama objects
+        
+    Returns:
+        PanoramaArrays with the panoramas and their float64 lat/lon columns
+    """
+    count = len(panoramas)
+    panos = np.empty(count, dtype=object)
+    panos[:] = panoramas
+    lats = np.fromiter((pano.lat for pano in panoramas), dtype=np.float64, count=count)
+    lons = np.fromiter((pano.lon for pano in panoramas), dtype=np.float64, count=count)
+    return PanoramaArrays(panos, lats, lons)
+
+# Coverage tile requests are latency-bound, so the tiles of one search are fetched
+# concurrently over a shared keep-alive session
+_SESSION = Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=TILE_FETCH_MAX_WORKERS, pool_maxsize=TILE_FETCH_MAX_WORKERS))
+_TILE_EXECUTOR = ThreadPoolExecutor(max_workers=TILE_FETCH_MAX_WORKERS, thread_name_prefix="tile-fetch")
+
+# Nearby searches and consecutive route steps keep landing on the same tiles. Fetches
+# still in flight are shared too, so concurrent searches never request a tile twice.
+_coverage_tile_cache = TTLCache(maxsize=COVERAGE_TILE_CACHE_SIZE, ttl=COVERAGE_TILE_CACHE_TTL)
+_coverage_tile_cache_lock = threading.Lock()
+_inflight_tile_fetches: Dict[Tuple[int, int], Future] = {}
+_tile_cache_stats = {"hits": 0, "misses": 0}  # process lifetime, guarded by the cache lock
+
+# Coordinate columns per cached tile, so a tile served from cache is not re-walked pano by
+# pano on every search. Entries remember their tile object and are rebuilt after a refetch.
+_coverage_tile_columns = TTLCache(maxsize=COVERAGE_TILE_CACHE_SIZE, ttl=COVERAGE_TILE_CACHE_TTL)
+
+def _fetch_coverage_tile(tile: Tuple[int, int]) -> CoverageTile:
+    """Fetch a single coverage tile using the streetlevel API and cache it."""
+    tile_x, tile_y = tile
+    try:
+        coverage = lookaround.get_coverage_tile(tile_x, tile_y, session=_SESSION)
+        with _coverage_tile_cache_lock:
+            _coverage_tile_cache[tile] = coverage
+        return coverage
+    finally:
+        with _coverage_tile_cache_lock:
+            _inflight_tile_fetches.pop(tile, None)
+
+def _coverage_tile_future(tile: Tuple[int, int]) -> Tuple[Future, bool]:
+    """
+    Return a future for a tile: resolved from cache, joined to an in-flight fetch, or newly
+    submitted, together with whether it was a cache hit.
+    """
+    with _coverage_tile_cache_lock:
+        cached = _coverage_tile_cache.get(tile)
+        if cached is not None:
+            _tile_cache_stats["hits"] += 1
+            logger.debug("Coverage tile cache hit for %s", tile)
+            future = Future()
+            future.set_result(cached)
+            return future, True
+        
+        _tile_cache_stats["misses"] += 1
+        future = _inflight_tile_fetches.get(tile)
+        if future is None:
+            future = _TILE_EXECUTOR.submit(_fetch_coverage_tile, tile)
+            _inflight_tile_fetches[tile] = future
+        return future, False
+
 def fetch_adaptive_tiles(selected_tiles: List[Tuple[int, int]]) -> List[CoverageTile]:
     """
     Fetch panoramas from selected tiles with detailed logging.
@@ -24,22 +105,32 @@ def fetch_adaptive_tiles(selected_tiles: List[Tuple[int, int]]) -> List[Coverage
     try:
         logger.info(f"Fetching panoramas from {len(selected_tiles)} tiles: {selected_tiles}")
         
-        for i, (tile_x, tile_y) in enumerate(selected_tiles):
+        # Request all tiles at once; total latency is the slowest tile, not the sum
+        lookups = [_coverage_tile_future(tile) for tile in selected_tiles]
+        futures = [future for future, _ in lookups]
+        with _coverage_tile_cache_lock:
+            total_hits = _tile_cache_stats["hits"]
+            total_lookups = total_hits + _tile_cache_stats["misses"]
+        logger.info("Tile cache: %d/%d hits (%.0f%% since start)",
+                    sum(hit for _, hit in lookups), len(selected_tiles),
+                    100.0 * total_hits / max(total_lookups, 1))
+        
+        for i, ((tile_x, tile_y), future) in enumerate(zip(selected_tiles, futures)):
             try:
-                # Fetch coverage tile using streetlevel API
-                coverage = lookaround.get_coverage_tile(tile_x, tile_y)
+                coverage = future.result()
                 
-                # Log detailed coverage response (matching original visibility)
+                # Log detailed coverage response (matching original visibility); lazy
+                # %-formatting skips the large tile repr when INFO is disabled
                 if i == 0:  # First tile is typically the center tile
-                    logger.info(f"Center tile coverage response: {coverage}")
+                    logger.info("Center tile coverage response: %s", coverage)
                 else:
-                    logger.info(f"Adjacent tile ({tile_x}, {tile_y}) coverage response: {coverage}")
+                    logger.info("Adjacent tile (%s, %s) coverage response: %s", tile_x, tile_y, coverage)
                 
                 if coverage and coverage.panos:
                     coverage_tiles.append(coverage)
-                    logger.info(f"Tile ({tile_x}, {tile_y}): Found {len(coverage.panos)} panoramas")
+                    logger.info("Tile (%s, %s): Found %d panoramas", tile_x, tile_y, len(coverage.panos))
                 else:
-                    logger.warning(f"Tile ({tile_x}, {tile_y}): No panoramas found")
+                    logger.warning("Tile (%s, %s): No panoramas found", tile_x, tile_y)
                     
             except Exception as e:
                 logger.error(f"Error fetching tile ({tile_x}, {tile_y}): {str(e)}")
@@ -87,46 +178,112 @@ def aggregate_panoramas(coverage_tiles: List[CoverageTile]) -> List[LookaroundPa
         logger.error(f"Error aggregating panoramas: {str(e)}")
         raise
 
-def rank_panoramas_by_distance(panoramas: List[LookaroundPanorama], 
+def _tile_columns(coverage_tile: CoverageTile) -> PanoramaArrays:
+    """Return the coordinate columns of a tile, built once per fetched tile object."""
+    key = (getattr(coverage_tile, "x", None), getattr(coverage_tile, "y", None))
+    with _coverage_tile_cache_lock:
+        cached = _coverage_tile_columns.get(key)
+    if cached is not None and cached[0] is coverage_tile:
+        return cached[1]
+    
+    columns = panorama_arrays(coverage_tile.panos)
+    if key != (None, None):
+        with _coverage_tile_cache_lock:
+            _coverage_tile_columns[key] = (coverage_tile, columns)
+    return columns
+
+def aggregate_panorama_arrays(coverage_tiles: List[CoverageTile]) -> PanoramaArrays:
+    """
+    Aggregate panoramas from multiple coverage tiles into coordinate columns.
+    
+    Args:
+        coverage_tiles: List of CoverageTile objects
+        
+    Returns:
+        PanoramaArrays covering all panoramas from all tiles
+    """
+    try:
+        tile_columns = [_tile_columns(coverage_tile) for coverage_tile in coverage_tiles if coverage_tile.panos]
+        total_panoramas = sum(len(columns.panos) for columns in tile_columns)
+        
+        logger.info(f"Aggregated {total_panoramas} panoramas from {len(coverage_tiles)} tiles")
+        
+        if not total_panoramas:
+            logger.error("No panoramas found in any coverage tile")
+            raise Exception("No panoramas found at this location")
+        
+        if len(tile_columns) == 1:
+            return tile_columns[0]
+        return PanoramaArrays(*(np.concatenate(column) for column in zip(*tile_columns)))
+        
+    except Exception as e:
+        logger.error(f"Error aggregating panoramas: {str(e)}")
+        raise
+
+# Below this many panoramas one Haversine pass over all of them is cheaper than the
+# bounding-box mask plus gather it would save (measured crossover ~1000)
+_BBOX_PREFILTER_MIN_PANOS = 1000
+
+def rank_panoramas_by_distance(panoramas: Union[List[LookaroundPanorama], PanoramaArrays], 
                               target_coord, 
-                              max_distance: float) -> List[LookaroundPanorama]:
+                              max_distance: float,
+                              top_k: Optional[int] = None) -> List[LookaroundPanorama]:
     """
     Rank panoramas by distance from target coordinate and filter by maximum distance.
     
     Args:
-        panoramas: List of LookaroundPanorama objects
+        panoramas: List of LookaroundPanorama objects, or their PanoramaArrays
         target_coord: Target coordinate (with lat, lng attributes)
         max_distance: Maximum distance in meters
+        top_k: Only return the top_k closest panoramas (all when None)
         
     Returns:
         List of panoramas ranked by distance, filtered by max_distance
     """
     try:
-        logger.info(f"Ranking {len(panoramas)} panoramas by distance (max: {max_distance}m)")
-        
-        # Calculate distances and filter panoramas
-        panorama_distances = []
-        for pano in panoramas:
-            distance = calculate_distance(target_coord.lat, target_coord.lng, pano.lat, pano.lon)
-            logger.info(f"Found panorama at ({pano.lat}, {pano.lon}), distance: {distance:.2f}m")
-            
-            if distance <= max_distance:
-                panorama_distances.append((pano, distance))
-        
-        if not panorama_distances:
+        if not isinstance(panoramas, PanoramaArrays):
+            panoramas = panorama_arrays(panoramas)
+        panos, lats, lons = panoramas
+        
+        logger.info(f"Ranking {len(panos)} panoramas by distance (max: {max_distance}m)")
+        
+        if len(panos) >= _BBOX_PREFILTER_MIN_PANOS:
+            # Reject obviously distant panoramas with a bounding-box test, then run the
+            # Haversine only on the survivors; rejected entries keep an infinite distance
+            near = np.flatnonzero(within_bounding_box(target_coord.lat, target_coord.lng, lats, lons, max_distance))
+            distances = np.full(len(panos), np.inf)
+            distances[near] = calculate_distance_vector(target_coord.lat, target_coord.lng, lats[near], lons[near])
+        else:
+            near = np.arange(len(panos))
+            distances = calculate_distance_vector(target_coord.lat, target_coord.lng, lats, lons)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for i in near:
+                logger.debug("Found panorama at (%s, %s), distance: %.2fm", lats[i], lons[i], distances[i])
+        
+        # Filter by distance
+        within = near[distances[near] <= max_distance]
+        if within.size == 0:
             logger.error(f"No panoramas found within {max_distance} meters of the location")
             raise Exception(f"No panoramas found within {max_distance} meters of the location")
         
-        # Sort by distance (closest first)
-        panorama_distances.sort(key=lambda x: x[1])
+        # Sort by distance (closest first), keeping input order for ties
+        if top_k == 1:
+            # argmin returns the first minimum, matching the stable sort
+            order = [int(within[np.argmin(distances[within])])]
+        elif top_k is not None and top_k < within.size:
+            # Partial selection: only the top_k nearest need ordering
+            order = heapq.nsmallest(top_k, within.tolist(), key=distances.__getitem__)
+        else:
+            order = within[np.argsort(distances[within], kind="stable")]
         
         # Extract panoramas in ranked order
-        ranked_panoramas = [pano for pano, distance in panorama_distances]
+        ranked_panoramas = panos[order].tolist()
         
-        logger.info(f"Ranked {len(ranked_panoramas)} panoramas within {max_distance}m")
-        if ranked_panoramas:
-            closest_distance = panorama_distances[0][1]
-            logger.info(f"Closest panorama distance: {closest_distance:.2f}m")
+        # One summary line instead of a line per panorama
+        in_range = distances[within]
+        logger.info("Ranked %d/%d panoramas within %sm, min=%.2fm, max=%.2fm",
+                    len(ranked_panoramas), len(panos), max_distance, in_range.min(), in_range.max())
         
         return ranked_panoramas
         
@@ -3,14 +3,22 @@ Utility functions for the image-harvest service.
 """
 import math
 import logging
+import re
+from functools import lru_cache
+import numpy as np
+
+# numba is optional: when installed, the scalar Haversine is JIT-compiled
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 logger = logging.getLogger(__name__)
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculate distance between two points in meters using the Haversine formula.
-    """
-    R = 6371000  # Earth's radius in meters
+EARTH_RADIUS_M = 6371000.0  # Mean Earth radius in meters
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = EARTH_RADIUS_M
     
     # Convert to radians
     lat1_rad = math.radians(lat1)
@@ -28,6 +36,120 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return R * c
 
+def _haversine_from_precomputed(lat1_rad: float, cos_lat1: float, lon1_rad: float, lat2: float, lon2: float) -> float:
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2) - lon1_rad
+    
+    a = math.sin(dlat/2)**2 + cos_lat1 * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return EARTH_RADIUS_M * c
+
+if njit is not None:
+    # Compiled on first call and cached on disk across restarts
+    _haversine = njit(cache=True, fastmath=True)(_haversine)
+    _haversine_from_precomputed = njit(cache=True, fastmath=True)(_haversine_from_precomputed)
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate distance between two points in meters using the Haversine formula.
+    """
+    return _haversine(lat1, lon1, lat2, lon2)
+
+def precompute_origin(lat: float, lon: float) -> tuple:
+    """
+    Precompute the loop-invariant terms of a fixed Haversine origin.
+    
+    Returns:
+        Tuple of (lat_rad, cos_lat, lon_rad) for calculate_distance_from_precomputed
+    """
+    lat_rad = math.radians(lat)
+    return lat_rad, math.cos(lat_rad), math.radians(lon)
+
+def calculate_distance_from_precomputed(lat1_rad: float, cos_lat1: float, lon1_rad: float,
+                                        lat2: float, lon2: float) -> float:
+    """
+    Calculate the Haversine distance in meters from a precomputed origin (see precompute_origin).
+    
+    Same result as calculate_distance, without re-deriving the origin's radians and cosine
+    when many points are measured against one coordinate.
+    """
+    return _haversine_from_precomputed(lat1_rad, cos_lat1, lon1_rad, lat2, lon2)
+
+def calculate_distance_vector(lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Calculate distances in meters from one point to arrays of points using the Haversine formula.
+    
+    Vectorized counterpart of calculate_distance for ranking many panoramas at once.
+    """
+    lat0_rad = math.radians(lat0)
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lats_rad - lat0_rad
+    dlon = np.radians(np.asarray(lons, dtype=np.float64)) - math.radians(lon0)
+    
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat0_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def within_bounding_box(lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray,
+                        radius_m: float, margin: float = 1.05) -> np.ndarray:
+    """
+    Cheap pre-filter for points that may lie within radius_m of (lat0, lon0).
+    
+    Compares per-axis degree offsets against the radius (with a safety margin), so everything
+    rejected is certainly farther than radius_m and only the survivors need a trig distance.
+    
+    Returns:
+        Boolean mask over lats/lons
+    """
+    threshold_deg = math.degrees(radius_m / EARTH_RADIUS_M) * margin
+    dlat = np.abs(np.asarray(lats, dtype=np.float64) - lat0)
+    # Wrap longitude differences into [-180, 180) so the antimeridian is handled
+    dlon = np.abs((np.asarray(lons, dtype=np.float64) - lon0 + 180.0) % 360.0 - 180.0)
+    return (dlat <= threshold_deg) & (dlon * math.cos(math.radians(lat0)) <= threshold_deg)
+
+def calculate_distance_fast(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate distance between two points in meters using the equirectangular approximation.
+    
+    Agrees with calculate_distance to well under a centimeter over a few tiles (< ~1 km), at a
+    fraction of the trig cost. Use calculate_distance for longer distances.
+    """
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) * 0.5))
+    return EARTH_RADIUS_M * math.sqrt(dlat * dlat + dlon * dlon)
+
+def calculate_distance_vector_fast(lat0: float, lon0: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized counterpart of calculate_distance_fast: equirectangular distances in meters from
+    one point to arrays of points. Only for short ranges (< ~1 km), e.g. search radii.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    dlat = np.radians(lats - lat0)
+    dlon = np.radians(np.asarray(lons, dtype=np.float64) - lon0) * np.cos(np.radians((lats + lat0) * 0.5))
+    return EARTH_RADIUS_M * np.sqrt(dlat * dlat + dlon * dlon)
+
+# Common street-type words and their abbreviations
+_STREET_ABBREVIATIONS = {
+    'avenue': 'ave',
+    'street': 'st',
+    'road': 'rd',
+    'boulevard': 'blvd',
+    'drive': 'dr',
+    'lane': 'ln',
+    'court': 'ct',
+    'circle': 'cir',
+    'highway': 'hwy',
+    'parkway': 'pkwy',
+}
+
+# Whole street-type words; trailing periods are removed with the rest of the punctuation
+_STREET_ABBREVIATION_RE = re.compile(r"\b(" + "|".join(_STREET_ABBREVIATIONS) + r")\b")
+
+# Anything that is not alphanumeric, whitespace or a comma (same set as str.isalnum/isspace)
+_PUNCTUATION_RE = re.compile(r"[^\w\s,]|_")
+
+@lru_cache(maxsize=1024)
 def normalize_address(address: str) -> str:
     """
     Normalize address string for comparison by removing common differences.
@@ -41,26 +163,11 @@ def normalize_address(address: str) -> str:
     # Convert to lowercase
     normalized = address.lower()
     
-    # Remove common abbreviations
-    replacements = {
-        'avenue': 'ave',
-        'street': 'st',
-        'road': 'rd',
-        'boulevard': 'blvd',
-        'drive': 'dr',
-        'lane': 'ln',
-        'court': 'ct',
-        'circle': 'cir',
-        'highway': 'hwy',
-        'parkway': 'pkwy',
-    }
-    
-    for full, abbr in replacements.items():
-        normalized = normalized.replace(full, abbr)
-        normalized = normalized.replace(f"{abbr}.", abbr)
+    # Abbreviate common street types in a single pass
+    normalized = _STREET_ABBREVIATION_RE.sub(lambda m: _STREET_ABBREVIATIONS[m.group(1)], normalized)
     
     # Remove punctuation except commas (needed for address parts)
-    normalized = ''.join(c for c in normalized if c.isalnum() or c.isspace() or c == ',')
+    normalized = _PUNCTUATION_RE.sub('', normalized)
     
     # Remove extra whitespace
     normalized = ' '.join(normalized.split())
@@ -2,124 +2,152 @@
 Image Harvest Service - Extracts street-view panorama images based on geographic location.
 """
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, List, Union, Dict
-import sys
-import platform
-from PIL import Image
+from typing import Optional, Dict
+import PIL
+from PIL import features
 import logging
+import queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-import io
-import uuid
-import geocoder
 from datetime import datetime
 import os
 import requests
-import time
+from requests.adapters import HTTPAdapter
+import orjson
 import math  # Add at the top with other imports
+import threading
+import asyncio
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
 
 # Import validate_coordinates function from geocoding module FIRST (loads our protobuf files)
 #from .core.geocoding import validate_coordinates
 
 # Import streetlevel modules AFTER our protobuf files are loaded
 from streetlevel import lookaround
-from streetlevel.lookaround import Face, Authenticator
+from streetlevel.lookaround import Authenticator
 
 # Import new adaptive search modules
 from app.core.boundary_analysis import calculate_boundary_distances, determine_search_strategy, select_adaptive_tiles
-from app.core.panorama_discovery import fetch_adaptive_tiles, aggregate_panoramas, rank_panoramas_by_distance
-from app.config import MAX_DISTANCE
+from app.core.panorama_discovery import fetch_adaptive_tiles, aggregate_panorama_arrays, rank_panoramas_by_distance
 from app.config import (
-    ROUTE_HEADING_SECTOR_DEGREES, 
-    ROUTE_MAX_PANORAMAS, 
-    ROUTE_PROXIMITY_THRESHOLD, 
-    ROUTE_CONFIDENCE_THRESHOLD
+    MAX_DISTANCE,
+    NOMINATIM_URL,
+    NOMINATIM_TIMEOUT,
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    MAX_CONCURRENT_DOWNLOADS,
+    IMAGE_CONVERSION_WORKERS,
+    FACE_DOWNLOAD_MAX_WORKERS,
+    OUTPUT_DIR
 )
 from app.core.utils import calculate_distance
+from app.core.image_conversion import HEIC_DECODER, heic_bytes_to_jpeg
+from app.core.nominatim import nominatim_get
 from app.route_processor import process_route_request
+from app.config import LOG_LEVEL, LOG_DIR, LOG_SESSION_FORMAT, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 # Setup session-specific file logging
-from pathlib import Path
-from datetime import datetime
-from app.config import LOG_DIR, LOG_SESSION_FORMAT
 
 # Create session-specific log file
 session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+Path(LOG_DIR).mkdir(parents=True, exist_ok=True)  # logs/ is not tracked, so a fresh checkout lacks it
 log_file = Path(LOG_DIR) / LOG_SESSION_FORMAT.format(timestamp=session_timestamp)
 
 # Configure file handler with same format as terminal
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.INFO)
+file_handler = RotatingFileHandler(log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT)
+file_handler.setLevel(LOG_LEVEL)
 file_handler.setFormatter(logging.Formatter('%(message)s'))  # Same as terminal
 
-# Add file handler to root logger
-logging.getLogger().addHandler(file_handler)
+# Request threads only enqueue records; a background listener does the file writes
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # flush queued records on shutdown
+
+# Add queue handler to root logger
+logging.getLogger().addHandler(QueueHandler(log_queue))
 
 logger.info(f"Session started - Log file: {log_file}")
 
-# Set up HEIC decoder
-try:
-    import pillow_heif
-    pillow_heif.register_heif_opener()
-    HEIC_DECODER = 'pillow-heif'
-    logger.info("Using pillow-heif for HEIC decoding")
-except ImportError:
-    try:
-        import pyheif
-        HEIC_DECODER = 'pyheif'
-        logger.info("Using pyheif for HEIC decoding")
-    except ImportError:
-        try:
-            from heic2rgb import decode_heic  # type: ignore
-            HEIC_DECODER = 'heic2rgb'
-            logger.info("Using heic2rgb for HEIC decoding")
-        except ImportError:
-            logger.error("No HEIC decoder found. Please install pillow-heif, pyheif, or heic2rgb")
-            sys.exit(1)
+# HEIC decoder is selected when app.core.image_conversion is imported
+logger.info(f"Using {HEIC_DECODER} for HEIC decoding")
+# Pillow-SIMD releases carry a ".postN" suffix (see PILLOW_SIMD in the Dockerfile)
+logger.info(f"Using Pillow {PIL.__version__}{' (SIMD build)' if '.post' in PIL.__version__ else ''} for JPEG encoding")
+if not features.check_feature("libjpeg_turbo"):
+    logger.warning("Pillow is not linked against libjpeg-turbo; JPEG encoding will be slower")
 
 # Create images directory structure
 IMAGES_DIR = Path("images/raw")
 IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
-# Initialize the authenticator
+# Output directories already created by this process, and a per-process filename prefix:
+# a startup stamp plus a counter keeps names unique without a strftime per harvest
+_created_output_dirs = set()
+_RUN_PREFIX = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+_harvest_counter = itertools.count()
+
+# HEIC decode + JPEG encode is CPU-bound; run it in worker processes so faces convert in
+# parallel across cores. "spawn" keeps workers from inheriting this process's threads.
+# The pool starts on the first conversion, not at import, so importers that never convert
+# (tests, tools, keep_heic-only use) don't spawn workers; the app's lifespan shuts it down
+_image_pool: Optional[ProcessPoolExecutor] = None
+_image_pool_lock = threading.Lock()
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    """Return the shared HEIC -> JPEG conversion pool, starting it on first use."""
+    global _image_pool
+    if _image_pool is None:
+        with _image_pool_lock:
+            if _image_pool is None:
+                _image_pool = ProcessPoolExecutor(max_workers=IMAGE_CONVERSION_WORKERS,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+    return _image_pool
+
+def _shutdown_image_pool() -> None:
+    """Stop the conversion pool's worker processes, if it was started."""
+    global _image_pool
+    with _image_pool_lock:
+        pool, _image_pool = _image_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+# Face downloads are network-bound, so the six faces of a panorama are fetched concurrently,
+# over keep-alive connections to the imagery CDN shared by all download threads
+_face_executor = ThreadPoolExecutor(max_workers=FACE_DOWNLOAD_MAX_WORKERS, thread_name_prefix="face-download")
+_face_session = requests.Session()
+_face_session.mount("https://", HTTPAdapter(pool_connections=FACE_DOWNLOAD_MAX_WORKERS, pool_maxsize=FACE_DOWNLOAD_MAX_WORKERS))
+
+# Initialize the authenticator once and share it. It signs each face URL locally (AES over
+# a fixed session ID, valid ~70 min from signing), so there is no token to fetch or refresh
+# and it is safe to use from the concurrent download threads.
 auth = Authenticator()
 
 from app.models import Coordinate, LocationRequest, ImageResponse, RouteRequest, RouteResponse
 
-def decode_heic_image(heic_data: bytes) -> Image.Image:
-    """
-    Decode HEIC image data using the best available decoder for the platform.
-    """
-    if HEIC_DECODER == 'heic2rgb':
-        # heic2rgb returns a numpy array
-        rgb_array = decode_heic(heic_data)
-        return Image.fromarray(rgb_array)
-    
-    elif HEIC_DECODER == 'pyheif':
-        # pyheif workflow
-        heif_file = pyheif.read(heic_data)
-        image = Image.frombytes(
-            heif_file.mode, 
-            heif_file.size, 
-            heif_file.data,
-            "raw",
-            heif_file.mode,
-            heif_file.stride,
-        )
-        return image
-    
-    else:  # pillow-heif
-        # pillow-heif workflow
-        with io.BytesIO(heic_data) as bio:
-            image = Image.open(bio)
-            return image.convert('RGB')
+# Geocoded addresses, keyed by normalized address -> (lat, lng)
+_geocode_cache = TTLCache(maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL)
+_geocode_cache_lock = threading.Lock()
+# Lookups in flight, keyed like the cache, so concurrent misses for one address share a request
+_geocode_inflight: Dict[str, Future] = {}
 
-def geocode_address(address: str) -> Coordinate:
-    """Convert address to coordinates using OpenStreetMap's Nominatim service."""
-    url = "https://nominatim.openstreetmap.org/search"
+def _cached_geocode(cache_key: str) -> Optional[Coordinate]:
+    """Return a fresh Coordinate for a cached address, or None on a miss."""
+    with _geocode_cache_lock:
+        cached = _geocode_cache.get(cache_key)
+    return Coordinate(lat=cached[0], lng=cached[1]) if cached is not None else None
+
+def _nominatim_search(address: str) -> tuple[float, float]:
+    """Look up one address on Nominatim and return its (lat, lng)."""
+    url = f"{NOMINATIM_URL}/search"
     
     # Try with structured search first
     params = {
@@ -129,39 +157,81 @@ def geocode_address(address: str) -> Coordinate:
         "limit": 1
     }
     
-    headers = {
-        "User-Agent": "VideoAIPlatform/1.0 (image-harvest-service)"
-    }
-    
-    try:
-        time.sleep(1)  # Respect Nominatim usage policy
-        
-        response = requests.get(url, params=params, headers=headers)
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Could not geocode address")
-            
-        results = response.json()
-        if not results:
-            raise HTTPException(status_code=400, detail="Address not found")
-            
-        result = results[0]
-        
-        # Log the result for debugging
-        logger.info(f"Geocoding result for {address}: lat={result['lat']}, lon={result['lon']}")
+    # Respect Nominatim usage policy: request slots (retries included) are handed out one at a
+    # time, but the request itself runs outside that lock, so a slow lookup doesn't hold up the others
+    response = nominatim_get(url, params=params, timeout=NOMINATIM_TIMEOUT)
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Could not geocode address")
         
-        return Coordinate(
-            lat=float(result["lat"]),
-            lng=float(result["lon"])
-        )
+    results = orjson.loads(response.content)
+    if not results:
+        raise HTTPException(status_code=400, detail="Address not found")
         
+    result = results[0]
+    
+    # Log the result for debugging
+    logger.info(f"Geocoding result for {address}: lat={result['lat']}, lon={result['lon']}")
+    
+    return float(result["lat"]), float(result["lon"])
+
+def geocode_address(address: str) -> Coordinate:
+    """Convert address to coordinates using OpenStreetMap's Nominatim service."""
+    cache_key = " ".join(address.lower().split())
+    coord = _cached_geocode(cache_key)
+    if coord is not None:
+        # Cache hits never reach Nominatim, so they skip the rate limiter too
+        logger.info(f"Geocoding cache hit for {address}")
+        return coord
+    
+    # The first miss for an address does the lookup; concurrent misses for the same address
+    # wait for its result instead of sending their own request
+    with _geocode_cache_lock:
+        cached = _geocode_cache.get(cache_key)
+        lookup = _geocode_inflight.get(cache_key) if cached is None else None
+        owner = cached is None and lookup is None
+        if owner:
+            lookup = _geocode_inflight[cache_key] = Future()
+    if cached is not None:
+        logger.info(f"Geocoding cache hit for {address}")
+        return Coordinate(lat=cached[0], lng=cached[1])
+    if not owner:
+        lat, lng = lookup.result()
+        return Coordinate(lat=lat, lng=lng)
+    
+    try:
+        lat_lng = _nominatim_search(address)
     except Exception as e:
         logger.error(f"Geocoding error: {str(e)}")
-        raise HTTPException(status_code=400, detail="Could not geocode address")
+        error = HTTPException(status_code=400, detail="Could not geocode address")
+        with _geocode_cache_lock:
+            del _geocode_inflight[cache_key]
+        lookup.set_exception(error)
+        raise error
+    
+    with _geocode_cache_lock:
+        _geocode_cache[cache_key] = lat_lng
+        del _geocode_inflight[cache_key]
+    lookup.set_result(lat_lng)
+    return Coordinate(lat=lat_lng[0], lng=lat_lng[1])
+
+def _download_face(pano, face_idx: int, output_path: str, keep_heic: bool = False) -> Optional[Future]:
+    """
+    Download one HEIC face. Returns the JPG conversion future, or None when the HEIC
+    bytes were written as-is (keep_heic).
+    """
+    heic_data = lookaround.get_panorama_face(pano, face_idx, 0, auth, session=_face_session)
+    if keep_heic:
+        with open(output_path, "wb") as f:
+            f.write(heic_data)
+        return None
+    return _get_image_pool().submit(heic_bytes_to_jpeg, heic_data, output_path)
 
-def download_lookaround_panorama(coord: Coordinate, session_id: str = None) -> tuple[str, dict]:
+def download_lookaround_panorama(coord: Coordinate, session_id: str = None, keep_heic: bool = False) -> tuple[str, dict]:
     """
     Download Apple Look Around panorama for a given coordinate and convert from HEIC to JPG.
     Downloads all 6 faces (BACK, LEFT, FRONT, RIGHT, TOP, BOTTOM) and returns FRONT face path.
+    With keep_heic, the faces are stored as downloaded (HEIC) and not decoded at all; use
+    decode_face_on_demand when pixels are needed.
     Returns tuple of (file_path, metadata)
     """
     try:
@@ -185,15 +255,15 @@ def download_lookaround_panorama(coord: Coordinate, session_id: str = None) -> t
                 raise Exception("No coverage tiles found at this location")
             
             # Aggregate panoramas from all tiles
-            all_panoramas = aggregate_panoramas(coverage_tiles)
-            if not all_panoramas:
+            all_panoramas = aggregate_panorama_arrays(coverage_tiles)
+            if not len(all_panoramas.panos):
                 logger.error("No panoramas found in selected tiles")
                 raise Exception("No panoramas found at this location")
             
-            logger.info(f"Found {len(all_panoramas)} panoramas across {len(selected_tiles)} tiles")
+            logger.info(f"Found {len(all_panoramas.panos)} panoramas across {len(selected_tiles)} tiles")
             
             # Rank panoramas by distance and select the best one
-            ranked_panoramas = rank_panoramas_by_distance(all_panoramas, coord, MAX_DISTANCE)
+            ranked_panoramas = rank_panoramas_by_distance(all_panoramas, coord, MAX_DISTANCE, top_k=1)
             
             if not ranked_panoramas:
                 raise Exception(f"No panoramas found within {MAX_DISTANCE} meters of the location")
@@ -211,29 +281,34 @@ def download_lookaround_panorama(coord: Coordinate, session_id: str = None) -> t
         try:
             # Simple session support
             if session_id:
-                output_dir = os.path.join("output", session_id)
+                output_dir = os.path.join(OUTPUT_DIR, session_id)
             else:
-                output_dir = "output"
-            os.makedirs(output_dir, exist_ok=True)
+                output_dir = OUTPUT_DIR
+            if output_dir not in _created_output_dirs:
+                os.makedirs(output_dir, exist_ok=True)
+                _created_output_dirs.add(output_dir)
+            
+            # Generate unique filename (also unique for concurrent harvests within one second)
+            timestamp = f"{_RUN_PREFIX}_{next(_harvest_counter):06d}"
             
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_format = "heic" if keep_heic else "jpg"
             
             # Download all 6 faces following streetlevel pattern
-            for face_idx in range(6):
-                heic_path = os.path.join(output_dir, f"pano_{timestamp}_{face_idx}.heic")
-                jpg_path = os.path.join(output_dir, f"pano_{timestamp}_{face_idx}.jpg")
-                
-                # Download face using streetlevel pattern
-                lookaround.download_panorama_face(pano, heic_path, face_idx, 0, auth)
-                
-                # Convert HEIC to JPG
-                img = Image.open(heic_path)
-                img.save(jpg_path, "JPEG")
-                os.remove(heic_path)
+            # All faces are requested at once; each converts in a worker process as soon as
+            # its HEIC bytes arrive, and only the final file is written to disk
+            face_paths = [os.path.join(output_dir, f"pano_{timestamp}_{face_idx}.{output_format}")
+                          for face_idx in range(6)]
+            downloads = [
+                _face_executor.submit(_download_face, pano, face_idx, face_path, keep_heic)
+                for face_idx, face_path in enumerate(face_paths)
+            ]
+            for download in as_completed(downloads):
+                conversion = download.result()
+                if conversion is not None:
+                    conversion.result()
             
             # Return front face path for backward compatibility (face_idx=2 is FRONT)
-            front_jpg_path = os.path.join(output_dir, f"pano_{timestamp}_2.jpg")
+            front_jpg_path = face_paths[2]
             
             # Return the JPG path and metadata
             # Convert heading from counter-clockwise (where 90° is West) to clockwise (where 90° is East)
@@ -252,7 +327,7 @@ def download_lookaround_panorama(coord: Coordinate, session_id: str = None) -> t
                 "elevation": pano.elevation,
                 "date": pano.date.isoformat() if pano.date else None,
                 "source_format": "heic",
-                "output_format": "jpg",
+                "output_format": output_format,
                 "distance_meters": min_distance
             }
             
@@ -266,10 +341,41 @@ def download_lookaround_panorama(coord: Coordinate, session_id: str = None) -> t
         logger.error(f"Error harvesting images: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Bounds how many panorama downloads run at once across all requests
+_download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+
+async def download_lookaround_panorama_async(coord: Coordinate, session_id: str = None,
+                                             keep_heic: bool = False) -> tuple[str, dict]:
+    """
+    Run download_lookaround_panorama in a worker thread so the event loop keeps serving
+    other requests while faces download; at most MAX_CONCURRENT_DOWNLOADS run in parallel.
+    """
+    async with _download_semaphore:
+        return await asyncio.to_thread(download_lookaround_panorama, coord, session_id, keep_heic)
+
+def _download_in_slot(loop: asyncio.AbstractEventLoop, coord: Coordinate, session_id: str = None) -> tuple[str, dict]:
+    """
+    Blocking download_lookaround_panorama for worker threads (route downloads): waits for a
+    _download_semaphore slot on the event loop first, so route and single-location downloads
+    share the MAX_CONCURRENT_DOWNLOADS limit.
+    """
+    asyncio.run_coroutine_threadsafe(_download_semaphore.acquire(), loop).result()
+    try:
+        return download_lookaround_panorama(coord, session_id)
+    finally:
+        loop.call_soon_threadsafe(_download_semaphore.release)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Shut down the conversion worker processes when the app stops."""
+    yield
+    _shutdown_image_pool()
+
 app = FastAPI(
     title="Image Harvest Service",
     description="Service for extracting street-view panorama images",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 @app.get("/health")
@@ -288,13 +394,13 @@ async def harvest_images(location: LocationRequest):
         
         # Process single coordinate
         if location.coordinates:
-            file_path, meta = download_lookaround_panorama(location.coordinates)
+            file_path, meta = await download_lookaround_panorama_async(location.coordinates, keep_heic=location.keep_heic)
             file_paths.append(file_path)
             metadata[file_path] = meta
             
         # Process address
         elif location.address:
-            coord = geocode_address(location.address)
+            coord = await asyncio.to_thread(geocode_address, location.address)
             # Call here validate_coordinates which calls Apple reverse_geocode function in geocoding.py to obtain the actual address
             #validation_result = validate_coordinates(coord, location.address)
             #if validation_result:
@@ -304,7 +410,7 @@ async def harvest_images(location: LocationRequest):
             #   "found_address": validation_result.found_address
             #   }
 
-            file_path, meta = download_lookaround_panorama(coord)
+            file_path, meta = await download_lookaround_panorama_async(coord, keep_heic=location.keep_heic)
             file_paths.append(file_path)
             metadata[file_path] = meta
         
@@ -328,12 +434,13 @@ async def harvest_route_images(route: RouteRequest):
     try:
         logger.info(f"Route request received: {route.start_address} to {route.end_address}")
         
-        # Use route processor with function references
-        file_paths, metadata = process_route_request(
+        # Use route processor with function references, off the event loop since it blocks
+        file_paths, metadata = await asyncio.to_thread(
+            process_route_request,
             route.start_address, 
             route.end_address,
             geocode_address,
-            download_lookaround_panorama
+            functools.partial(_download_in_slot, asyncio.get_running_loop())
         )
         
         return RouteResponse(file_paths=file_paths, metadata=metadata)
@@ -13,6 +13,7 @@ class LocationRequest(BaseModel):
     """Request model for location-based image harvesting."""
     coordinates: Optional[Coordinate] = Field(None, description="Latitude and longitude coordinates")
     address: Optional[str] = Field(None, description="Street address to geocode")
+    keep_heic: bool = Field(False, description="Store faces as downloaded HEIC instead of converting to JPG")
 
 class ImageResponse(BaseModel):
     """Response model for harvested images."""
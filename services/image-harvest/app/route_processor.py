@@ -1,16 +1,135 @@
-from typing import List, Dict, Tuple
+import hashlib
+import logging
+import math
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import orjson
+from cachetools import TTLCache
 from app.models import Coordinate
+from app.street_heuristics import apply_street_heuristics, extract_street_name
+from app.core.boundary_analysis import (
+    calculate_boundary_distances,
+    determine_search_strategy,
+    select_adaptive_tiles
+)
+from app.core.panorama_discovery import fetch_adaptive_tiles, aggregate_panorama_arrays
+from app.core.utils import (
+    calculate_distance,
+    calculate_distance_vector,
+    calculate_distance_vector_fast,
+    normalize_address
+)
+from app.core.nominatim import nominatim_get
+from app.config import (
+    NOMINATIM_URL,
+    NOMINATIM_TIMEOUT,
+    REVERSE_GEOCODE_CACHE_SIZE,
+    REVERSE_GEOCODE_CACHE_TTL,
+    COORDINATE_CACHE_DECIMALS,
+    ROUTE_HEADING_SECTOR_DEGREES,
+    ROUTE_MAX_PANORAMAS,
+    ROUTE_PROXIMITY_THRESHOLD,
+    ROUTE_CONFIDENCE_THRESHOLD,
+    ROUTE_SEARCH_RADIUS,
+    ROUTE_MAX_CANDIDATES,
+    ROUTE_PROGRESSION_THRESHOLD,
+    ROUTE_MAX_AMBIGUOUS_SKIPS,
+    ROUTE_MAX_AMBIGUITY_LOOKUPS,
+    ROUTE_BACKGROUND_STREET_LOOKUPS,
+    ROUTE_DOWNLOAD_LOOKAHEAD
+)
+
+# Street names from Nominatim reverse lookups keyed by rounded (lat, lon); "" means no road.
+# Consecutive route steps keep re-checking panoramas at the same spots.
+_reverse_street_cache = TTLCache(maxsize=REVERSE_GEOCODE_CACHE_SIZE, ttl=REVERSE_GEOCODE_CACHE_TTL)
+_reverse_street_cache_lock = threading.Lock()
+
+# With ROUTE_BACKGROUND_STREET_LOOKUPS, uncached reverse lookups for ambiguous steps are queued
+# here instead of blocking the route loop; the single worker sends them one at a time under the
+# Nominatim rate limit and fills the cache for later steps. Lookups already queued are not
+# queued again.
+_street_lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="street-lookup")
+_inflight_street_lookups: Dict[Tuple[float, float], Future] = {}
+
+def _download_route_panorama(download_func, coord: Coordinate, session_id: str):
+    """
+    Download one route panorama, retrying once when the download fails.
+    
+    The walk has already moved on from this panorama by the time the download finishes: its
+    coordinates and heading come from the coverage tile, not the images, so a download that
+    fails twice leaves a gap in the images rather than sending the route back.
+    """
+    try:
+        return download_func(coord, session_id)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Route download failed for ({coord.lat}, {coord.lng}), retrying: {str(e)}")
+        return download_func(coord, session_id)
+
+def _reverse_street_name(lat: float, lon: float) -> Tuple[Optional[str], bool]:
+    """
+    Look up the road name at a coordinate via Nominatim, served from cache when possible.
+    
+    Returns:
+        Tuple of (street name, "" when there is no road or None when the request failed,
+        whether a Nominatim request was made)
+    """
+    cache_key = (round(lat, COORDINATE_CACHE_DECIMALS), round(lon, COORDINATE_CACHE_DECIMALS))
+    with _reverse_street_cache_lock:
+        street = _reverse_street_cache.get(cache_key)
+    if street is not None:
+        return street, False
+    
+    url = f"{NOMINATIM_URL}/reverse?format=json&lat={lat}&lon={lon}&zoom=18&addressdetails=1"
+    # Shares the 1 req/s Nominatim budget (retries included) with forward geocoding
+    resp = nominatim_get(url, timeout=NOMINATIM_TIMEOUT)
+    if resp.status_code != 200:
+        return None, True
+    
+    street = orjson.loads(resp.content).get("address", {}).get("road", "")
+    with _reverse_street_cache_lock:
+        _reverse_street_cache[cache_key] = street
+    return street, True
+
+def _lookup_street_in_background(cache_key: Tuple[float, float], lat: float, lon: float) -> None:
+    """Run one queued reverse lookup; failures are not cached, so a later step retries."""
+    try:
+        _reverse_street_name(lat, lon)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Background street lookup failed for ({lat}, {lon}): {str(e)}")
+    finally:
+        with _reverse_street_cache_lock:
+            _inflight_street_lookups.pop(cache_key, None)
+
+def _street_name_nowait(lat: float, lon: float) -> Tuple[Optional[str], bool]:
+    """
+    Return the cached road name at a coordinate, queueing a background lookup on a miss.
+    
+    Returns:
+        Tuple of (street name, "" when there is no road or None when not known yet,
+        whether a new lookup was queued)
+    """
+    cache_key = (round(lat, COORDINATE_CACHE_DECIMALS), round(lon, COORDINATE_CACHE_DECIMALS))
+    with _reverse_street_cache_lock:
+        street = _reverse_street_cache.get(cache_key)
+        if street is not None:
+            return street, False
+        if cache_key in _inflight_street_lookups:
+            return None, False
+        _inflight_street_lookups[cache_key] = _street_lookup_executor.submit(
+            _lookup_street_in_background, cache_key, lat, lon)
+        return None, True
 
 def apply_street_heuristics_func(candidates: list, start_street: str, current_head_coord: Coordinate, end_coord: Coordinate, current_heading: float, config: dict, logger) -> list:
     """
     Filter and score candidates using proximity, heading, and progression.
-    Returns filtered list with confidence scores.
+    Returns the first progressing, heading-aligned candidate; without one, the candidates
+    passing the street heuristics confidence threshold (all candidates when there is no heading).
     """
     try:
-        from app.street_heuristics import apply_street_heuristics
-        from app.core.utils import calculate_distance
-        import math
-        
         # OPTIMIZATION: Early termination - find first candidate that meets all criteria
         if current_heading is not None:
             heading_sector = config.get("ROUTE_HEADING_SECTOR_DEGREES", 60)
@@ -19,49 +138,57 @@ def apply_street_heuristics_func(candidates: list, start_street: str, current_he
             current_to_end = calculate_distance(current_head_coord.lat, current_head_coord.lng, end_coord.lat, end_coord.lng)
             logger.info(f"Current distance to destination: {current_to_end:.2f}m")
             
-            for pano in candidates:  # Already sorted by distance (closest first)
-                # PROGRESSION CHECK: Ensure candidate moves toward destination
-                candidate_to_end = calculate_distance(pano.lat, pano.lon, end_coord.lat, end_coord.lng)
-                
-                if candidate_to_end >= current_to_end:
-                    logger.info(f"Rejected {pano.id}: No progress toward destination ({candidate_to_end:.2f}m vs {current_to_end:.2f}m)")
-                    continue  # Skip candidates that don't progress toward destination
-                
-                # HEADING CHECK: Only check heading for candidates that progress toward destination
-                if hasattr(pano, 'heading'):
-                    # Convert pano.heading from radians to degrees for comparison
-                    # Apply same coordinate system conversion as in main.py
-                    heading_degrees_ccw = math.degrees(pano.heading) % 360  # Counter-clockwise
-                    pano_heading_degrees = (360 - heading_degrees_ccw) % 360  # Convert to clockwise
-                    heading_diff = abs((pano_heading_degrees - current_heading + 180) % 360 - 180)
-                    
-                    if heading_diff <= heading_sector:
-                        logger.info(f"EARLY TERMINATION: Found perfect match - {pano.id} at distance {calculate_distance(current_head_coord.lat, current_head_coord.lng, pano.lat, pano.lon):.1f}m")
-                        logger.info(f"Progression: {candidate_to_end:.2f}m vs {current_to_end:.2f}m (closer to destination)")
-                        logger.info(f"Heading aligned: {pano_heading_degrees:.1f}° vs {current_heading:.1f}° (diff: {heading_diff:.1f}°)")
-                        return [pano]  # Return single candidate for immediate selection
+            # Evaluate every candidate at once; candidates are already sorted by distance
+            # (closest first), so the first one passing both checks is the match
+            count = len(candidates)
+            lats = np.fromiter((pano.lat for pano in candidates), dtype=np.float64, count=count)
+            lons = np.fromiter((pano.lon for pano in candidates), dtype=np.float64, count=count)
+            headings = np.fromiter((np.nan if getattr(pano, 'heading', None) is None else pano.heading
+                                    for pano in candidates), dtype=np.float64, count=count)
+            
+            # PROGRESSION CHECK: Ensure candidate moves toward destination
+            candidate_to_end = calculate_distance_vector(end_coord.lat, end_coord.lng, lats, lons)
+            progresses = candidate_to_end < current_to_end
+            
+            # HEADING CHECK: Convert pano headings from counter-clockwise radians to clockwise
+            # degrees (same conversion as in main.py); candidates without heading info pass
+            pano_heading_degrees = (360 - np.degrees(headings) % 360) % 360
+            heading_diff = np.abs((pano_heading_degrees - current_heading + 180) % 360 - 180)
+            has_heading = ~np.isnan(headings)
+            accepted = progresses & (~has_heading | (heading_diff <= heading_sector))
+            
+            match = int(np.argmax(accepted)) if count and accepted.any() else count
+            if logger.isEnabledFor(logging.DEBUG):
+                for i in range(match):
+                    if not progresses[i]:
+                        logger.debug("Rejected %s: No progress toward destination (%.2fm vs %.2fm)",
+                                     candidates[i].id, candidate_to_end[i], current_to_end)
                     else:
-                        logger.info(f"Rejected {pano.id}: Heading misaligned {pano_heading_degrees:.1f}° vs {current_heading:.1f}° (diff: {heading_diff:.1f}°)")
+                        logger.debug("Rejected %s: Heading misaligned %.1f° vs %.1f° (diff: %.1f°)",
+                                     candidates[i].id, pano_heading_degrees[i], current_heading, heading_diff[i])
+            
+            if match < count:
+                pano = candidates[match]
+                if has_heading[match]:
+                    logger.info(f"EARLY TERMINATION: Found perfect match - {pano.id} at distance {calculate_distance(current_head_coord.lat, current_head_coord.lng, pano.lat, pano.lon):.1f}m")
+                    logger.info(f"Progression: {candidate_to_end[match]:.2f}m vs {current_to_end:.2f}m (closer to destination)")
+                    logger.info(f"Heading aligned: {pano_heading_degrees[match]:.1f}° vs {current_heading:.1f}° (diff: {heading_diff[match]:.1f}°)")
                 else:
                     # If no heading info, include the candidate (but still check progression)
                     logger.info(f"EARLY TERMINATION: Found candidate without heading info - {pano.id}")
-                    logger.info(f"Progression: {candidate_to_end:.2f}m vs {current_to_end:.2f}m (closer to destination)")
-                    return [pano]  # Return single candidate for immediate selection
+                    logger.info(f"Progression: {candidate_to_end[match]:.2f}m vs {current_to_end:.2f}m (closer to destination)")
+                return [pano]  # Return single candidate for immediate selection
             
-            logger.info("No candidates passed progression + heading alignment - will use fallback scoring")
-            return []  # No early match found, fallback to current scoring
+            logger.info(f"No candidates passed progression + heading alignment ({int(progresses.sum())}/{count} progress) - will use fallback scoring")
         else:
             logger.info("No current heading available - will use fallback scoring")
             return candidates  # Return all candidates for fallback scoring
         
-        # FALLBACK: Apply additional street heuristics if no early termination
-        if candidates:  # Only apply if we have candidates from early termination
-            filtered = apply_street_heuristics(candidates, start_street, current_head_coord, end_coord)
-            logger.info(f"FALLBACK: Applied street heuristics, {len(filtered)} candidates remain.")
-            return filtered
-        else:
-            logger.info("FALLBACK: No candidates from early termination, returning empty list")
-            return []
+        # FALLBACK: No heading-aligned match, so filter by the proximity + progression confidence
+        # score instead (e.g. where the street turns)
+        filtered = apply_street_heuristics(candidates, start_street, current_head_coord, end_coord)
+        logger.info(f"FALLBACK: Applied street heuristics, {len(filtered)} candidates remain.")
+        return filtered
     except Exception as e:
         logger.error(f"Error in apply_street_heuristics_func: {str(e)}")
         return candidates
@@ -71,6 +198,8 @@ def select_next_panorama_func(filtered_candidates: list, current_coord: Coordina
     """
     Select the best next panorama from filtered candidates.
     Handles ambiguity: if multiple candidates are tied, uses Nominatim API if needed, or skips up to 2 times.
+    With background street lookups, uncached lookups are queued and the best-scored candidate
+    is taken right away instead of waiting for them.
     Updates ambiguity state (skips, API calls).
     Returns: (Selected panorama (or None), updated ambiguity state)
     """
@@ -78,29 +207,24 @@ def select_next_panorama_func(filtered_candidates: list, current_coord: Coordina
         if not filtered_candidates:
             logger.info("No filtered candidates to select from.")
             return None, ambiguity_state
-        # Score by proximity and progression
-        from app.core.utils import calculate_distance
-        scored = []
-        for pano in filtered_candidates:
-            dist_to_current = calculate_distance(current_coord.lat, current_coord.lng, pano.lat, pano.lon)
-            dist_to_end = calculate_distance(pano.lat, pano.lon, end_coord.lat, end_coord.lng)
-            score = 0
-            # Closer to current is better
-            if dist_to_current < 50:
-                score += 2
-            elif dist_to_current < 100:
-                score += 1
-            # Progression toward end
-            if dist_to_end < calculate_distance(current_coord.lat, current_coord.lng, end_coord.lat, end_coord.lng):
-                    score += 2
-            scored.append((score, pano, dist_to_end))
-        if not scored:
-            logger.info("No scored candidates.")
-            return None, ambiguity_state
-        # Sort by score (desc), then by progression (closer to end)
-        scored.sort(key=lambda x: (-x[0], x[2]))
-        top_score = scored[0][0]
-        top_candidates = [p for s, p, d in scored if s == top_score]
+        # Score by proximity and progression, over coordinate columns for all candidates at once
+        count = len(filtered_candidates)
+        lats = np.fromiter((pano.lat for pano in filtered_candidates), dtype=np.float64, count=count)
+        lons = np.fromiter((pano.lon for pano in filtered_candidates), dtype=np.float64, count=count)
+        # Proximity is a short range, so the equirectangular form suffices; distances to the
+        # end can be kilometers and keep the Haversine
+        dist_to_current = calculate_distance_vector_fast(current_coord.lat, current_coord.lng, lats, lons)
+        dist_to_end = calculate_distance_vector(end_coord.lat, end_coord.lng, lats, lons)
+        current_to_end = calculate_distance(current_coord.lat, current_coord.lng, end_coord.lat, end_coord.lng)
+        # Closer to current is better (+2 under 50m, +1 under 100m); progression toward end (+2)
+        scores = (np.where(dist_to_current < 50, 2, np.where(dist_to_current < 100, 1, 0))
+                  + np.where(dist_to_end < current_to_end, 2, 0))
+        # Only the top-score group is used: take it with one max, then order just that group
+        # by progression (closer to end first); the stable sort keeps input order for ties
+        top_score = int(scores.max())
+        top_indices = np.flatnonzero(scores == top_score)
+        top_indices = top_indices[np.argsort(dist_to_end[top_indices], kind="stable")]
+        top_candidates = [filtered_candidates[i] for i in top_indices]
         if len(top_candidates) == 1:
             logger.info(f"Selected panorama with score {top_score}.")
             return top_candidates[0], ambiguity_state
@@ -110,21 +234,31 @@ def select_next_panorama_func(filtered_candidates: list, current_coord: Coordina
         api_calls = ambiguity_state.get("api_calls", 0)
         skips = ambiguity_state.get("skips", 0)
         try:
-            from app.core.utils import normalize_address
-            import requests
-            for pano in top_candidates:
-                # Reverse geocode pano location
-                url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={pano.lat}&lon={pano.lon}&zoom=18&addressdetails=1"
-                resp = requests.get(url, headers={"User-Agent": "image-harvest-service"}, timeout=5)
-                api_calls += 1
-                if resp.status_code == 200:
-                    data = resp.json()
-                    street = data.get("address", {}).get("road", "")
-                    if street and normalize_address(street) == normalize_address(start_street):
-                        logger.info(f"Selected panorama after Nominatim check: {street}")
-                        ambiguity_state["api_calls"] = api_calls
-                        ambiguity_state["skips"] = skips
-                        return pano, ambiguity_state
+            target_street = normalize_address(start_street)
+            background = config.get("ROUTE_BACKGROUND_STREET_LOOKUPS", ROUTE_BACKGROUND_STREET_LOOKUPS)
+            pending = 0
+            # Candidates are ordered closest-to-end first; only the best few are worth a lookup
+            for pano in top_candidates[:ROUTE_MAX_AMBIGUITY_LOOKUPS]:
+                # Reverse geocode pano location (from cache, or queued when in the background)
+                if background:
+                    street, requested = _street_name_nowait(pano.lat, pano.lon)
+                    pending += street is None
+                else:
+                    street, requested = _reverse_street_name(pano.lat, pano.lon)
+                if requested:
+                    api_calls += 1
+                if street and normalize_address(street) == target_street:
+                    logger.info(f"Selected panorama after Nominatim check: {street}")
+                    ambiguity_state["api_calls"] = api_calls
+                    ambiguity_state["skips"] = skips
+                    return pano, ambiguity_state
+            if pending:
+                # Don't wait for the network: take the best candidate by score and progression;
+                # the queued lookups answer later steps at the same spots from cache
+                logger.info(f"Street lookups pending for {pending} candidates; selected best heuristic candidate.")
+                ambiguity_state["api_calls"] = api_calls
+                ambiguity_state["skips"] = skips
+                return top_candidates[0], ambiguity_state
             # If none match, skip
             skips += 1
             logger.info(f"No matching street found via Nominatim. Skipping (skips={skips}).")
@@ -145,22 +279,10 @@ def find_nearby_panoramas_func(current_coord: Coordinate, search_radius: float,
     """
     Find all panoramas within a given radius of the current position.
     Reuse tile search logic if no panos found in initial radius.
-    Exclude already visited panos.
+    Exclude already visited panos (visited_set holds (id, build_id) tuples).
     Returns: List of panorama candidates.
     """
     try:
-        from app.core.boundary_analysis import (
-            calculate_boundary_distances,
-            determine_search_strategy,
-            select_adaptive_tiles
-        )
-        from app.core.panorama_discovery import (
-            fetch_adaptive_tiles,
-            aggregate_panoramas,
-            rank_panoramas_by_distance
-        )
-        from app.core.utils import calculate_distance
-        
         logger.info(f"Searching for nearby panoramas at ({current_coord.lat}, {current_coord.lng}) with radius {search_radius}m")
         
         # Calculate boundary distances and determine search strategy
@@ -174,29 +296,35 @@ def find_nearby_panoramas_func(current_coord: Coordinate, search_radius: float,
             logger.warning("No coverage tiles found")
             return []
         
-        # Aggregate panoramas from all tiles
-        all_panoramas = aggregate_panoramas(coverage_tiles)
-        if not all_panoramas:
+        # Aggregate panoramas from all tiles into coordinate columns
+        panos, lats, lons = aggregate_panorama_arrays(coverage_tiles)
+        if not len(panos):
             logger.warning("No panoramas found in selected tiles")
             return []
         
-        logger.info(f"Found {len(all_panoramas)} total panoramas across {len(selected_tiles)} tiles")
+        logger.info(f"Found {len(panos)} total panoramas across {len(selected_tiles)} tiles")
         
-        # Filter by distance and exclude visited
-        candidates = []
-        for pano in all_panoramas:
-            distance = calculate_distance(current_coord.lat, current_coord.lng, pano.lat, pano.lon)
-            pano_id = f"{pano.id}_{pano.build_id}"
-            
-            if distance <= search_radius and pano_id not in visited_set:
-                candidates.append(pano)
-                logger.info(f"Found candidate: {pano_id} at distance {distance:.2f}m")
+        # One distance pass over all panoramas (equirectangular: the tiles span well under a
+        # kilometer); filtering and ordering by distance (closest first) reuse it
+        distances = calculate_distance_vector_fast(current_coord.lat, current_coord.lng, lats, lons)
+        in_range = np.flatnonzero(distances <= search_radius)
         
-        logger.info(f"Found {len(candidates)} unvisited candidates within {search_radius}m")
+        # Exclude visited, then keep only the nearest max_candidates: the heuristics consume
+        # candidates closest first, so a partial selection replaces the full sort
+        unvisited = np.array([i for i in in_range if (panos[i].id, panos[i].build_id) not in visited_set], dtype=np.intp)
+        max_candidates = config.get("ROUTE_MAX_CANDIDATES", ROUTE_MAX_CANDIDATES)
+        if len(unvisited) > max_candidates:
+            nearest = np.argpartition(distances[unvisited], max_candidates - 1)[:max_candidates]
+            unvisited = np.sort(unvisited[nearest])
+        # The stable sort keeps tile order for equal distances
+        nearest_first = unvisited[np.argsort(distances[unvisited], kind="stable")]
+        candidates = panos[nearest_first].tolist()
+        if logger.isEnabledFor(logging.DEBUG):
+            for i in nearest_first:
+                logger.debug("Found candidate: %s_%s at distance %.2fm", panos[i].id, panos[i].build_id, distances[i])
         
-        # OPTIMIZATION: Sort candidates by distance (closest first)
-        candidates.sort(key=lambda pano: calculate_distance(current_coord.lat, current_coord.lng, pano.lat, pano.lon))
-        logger.info(f"Sorted {len(candidates)} candidates by distance (closest first)")
+        logger.info(f"Found {len(candidates)} nearest unvisited candidates within {search_radius}m "
+                    f"({len(in_range)} in range), sorted by distance (closest first)")
         
         return candidates
         
@@ -204,26 +332,26 @@ def find_nearby_panoramas_func(current_coord: Coordinate, search_radius: float,
         logger.error(f"Error in find_nearby_panoramas_func: {str(e)}")
     return []
 
-def should_terminate_route(current_coord: Coordinate, end_coord: Coordinate, pano_count: int, ambiguity_skips: int, config: dict) -> bool:
+def should_terminate_route(current_coord: Coordinate, end_coord: Coordinate, pano_count: int, ambiguity_skips: int, config: dict) -> Optional[str]:
     """
     Checks all termination conditions (proximity to end, max panos, ambiguity skips, dead-ends).
-    Returns: Boolean (terminate/continue)
+    Returns: Termination reason ("max_panos", "ambiguity_skips" or "proximity_to_end"), or None to continue
     """
     try:
-        from app.core.utils import calculate_distance
         proximity_threshold = config.get("ROUTE_PROGRESSION_THRESHOLD", 10)
         max_panos = config.get("ROUTE_MAX_PANORAMAS", 50)
         max_skips = config.get("ROUTE_MAX_AMBIGUOUS_SKIPS", 2)
-        dist_to_end = calculate_distance(current_coord.lat, current_coord.lng, end_coord.lat, end_coord.lng)
-        if dist_to_end <= proximity_threshold:
-            return True
+        # Counter checks first; the distance is only computed when they pass
         if pano_count >= max_panos:
-            return True
+            return "max_panos"
         if ambiguity_skips > max_skips:
-            return True
-        return False
+            return "ambiguity_skips"
+        dist_to_end = calculate_distance(current_coord.lat, current_coord.lng, end_coord.lat, end_coord.lng)
+        if dist_to_end <= proximity_threshold:
+            return "proximity_to_end"
+        return None
     except Exception as e:
-        return False 
+        return None
 
 def progress_along_route(
     start_coord, end_coord, start_street, geocode_func, download_func,
@@ -238,9 +366,6 @@ def progress_along_route(
         metadata_dict: Dict mapping file paths to panorama metadata.
         summary: Dict with route summary (distance, panos, API calls, etc.)
     """
-    import hashlib
-    from datetime import datetime
-    
     logger.info(f"Starting progress_along_route from ({start_coord.lat}, {start_coord.lng}) to ({end_coord.lat}, {end_coord.lng})")
     
     # Generate session ID for route processing
@@ -259,8 +384,32 @@ def progress_along_route(
     total_distance = 0.0
     api_calls = 0
     ambiguity_skips = 0
+    download_failures = 0  # kept apart from ambiguity_skips so they don't end the route early
     ambiguity_state = {"api_calls": 0, "skips": 0}
     
+    # Downloads still in flight, oldest first: (future, distance from previous panorama)
+    pending_downloads = deque()
+    # Selecting the next panorama only needs its coordinates and heading, not its images, so
+    # downloads run here while the loop moves on. Each route has its own workers, so one
+    # route's lookahead never queues behind another's
+    download_executor = ThreadPoolExecutor(max_workers=max(1, ROUTE_DOWNLOAD_LOOKAHEAD), thread_name_prefix="route-download")
+    
+    def collect_download():
+        """Wait for the oldest download and record it, in route order."""
+        nonlocal pano_count, total_distance, download_failures
+        future, distance_to_previous = pending_downloads.popleft()
+        try:
+            file_path, metadata = future.result()
+        except Exception as e:
+            logger.error(f"Error downloading panorama: {str(e)}")
+            pano_count -= 1
+            total_distance -= distance_to_previous
+            download_failures += 1
+            return
+        file_paths.append(file_path)
+        metadata_dict[file_path] = metadata
+        logger.info(f"Downloaded panorama {len(file_paths)}: {file_path} (distance: {distance_to_previous:.2f}m)")
+    
     try:
         # Download and store the first panorama
         logger.info("Downloading initial panorama at start location")
@@ -273,9 +422,8 @@ def progress_along_route(
             current_heading = metadata['heading_degrees']
             logger.info(f"Initial heading: {current_heading} degrees")
         
-        # Add to visited set
-        pano_id = f"{metadata.get('id', 'unknown')}_{metadata.get('build_id', 'unknown')}"
-        visited_set.add(pano_id)
+        # Add to visited set, keyed by (id, build_id)
+        visited_set.add((metadata.get('id', 'unknown'), metadata.get('build_id', 'unknown')))
         pano_count += 1
         
         # FIX: Update current_coord to first panorama location
@@ -287,7 +435,8 @@ def progress_along_route(
             logger.info(f"Updated current_coord to first panorama location: ({current_coord.lat}, {current_coord.lng})")
         
         # Main loop: find, filter, select, download, update state
-        while not should_terminate_route(current_coord, end_coord, pano_count, ambiguity_skips, config):
+        # The loop condition records why the route stopped; a break leaves it None
+        while not (termination_reason := should_terminate_route(current_coord, end_coord, pano_count, ambiguity_skips, config)):
             logger.info(f"Iteration {pano_count}: Current position ({current_coord.lat}, {current_coord.lng})")
             
             # Find nearby panoramas
@@ -322,35 +471,36 @@ def progress_along_route(
                 ambiguity_skips += 1
                 continue
             
-            # Download the selected panorama
-            try:
-                pano_coord = Coordinate(lat=next_pano.lat, lng=next_pano.lon)
-                file_path, metadata = download_func(pano_coord, session_id)
-                file_paths.append(file_path)
-                metadata_dict[file_path] = metadata
-                
-                # Update state
-                pano_id = f"{next_pano.id}_{next_pano.build_id}"
-                visited_set.add(pano_id)
-                pano_count += 1
-                
-                # Update current position and heading
-                from app.core.utils import calculate_distance
-                distance_to_previous = calculate_distance(current_coord.lat, current_coord.lng, next_pano.lat, next_pano.lon)
-                total_distance += distance_to_previous
-                current_coord = pano_coord
-                
-                # Update heading if available - use metadata heading_degrees (in degrees)
-                if isinstance(metadata, dict) and 'heading_degrees' in metadata and metadata['heading_degrees'] is not None:
-                    current_heading = metadata['heading_degrees']
-                    logger.info(f"Updated heading from metadata: {current_heading} degrees")
-                
-                logger.info(f"Downloaded panorama {pano_count}: {file_path} (distance: {distance_to_previous:.2f}m)")
-                
-            except Exception as e:
-                logger.error(f"Error downloading panorama: {str(e)}")
-                ambiguity_skips += 1
-                continue
+            # Download the selected panorama in the background and advance right away. Unlike the
+            # blocking download this replaced, a failure doesn't keep the walk here: the failed
+            # download is retried once, and if it fails again only its images are missing
+            pano_coord = Coordinate(lat=next_pano.lat, lng=next_pano.lon)
+            distance_to_previous = calculate_distance(current_coord.lat, current_coord.lng, next_pano.lat, next_pano.lon)
+            pending_downloads.append((
+                download_executor.submit(_download_route_panorama, download_func, pano_coord, session_id),
+                distance_to_previous,
+            ))
+            
+            # Update state
+            visited_set.add((next_pano.id, next_pano.build_id))
+            pano_count += 1
+            
+            # Update current position and heading
+            total_distance += distance_to_previous
+            current_coord = pano_coord
+            
+            # Update heading if available - same counter-clockwise radians -> clockwise degrees
+            # conversion as the heading_degrees download metadata
+            if getattr(next_pano, 'heading', None) is not None:
+                current_heading = (360 - math.degrees(next_pano.heading) % 360) % 360
+                logger.info(f"Updated heading from panorama: {current_heading} degrees")
+            
+            # Keep at most ROUTE_DOWNLOAD_LOOKAHEAD downloads in flight
+            while len(pending_downloads) > ROUTE_DOWNLOAD_LOOKAHEAD:
+                collect_download()
+        
+        while pending_downloads:
+            collect_download()
         
         # Log summary
         summary = {
@@ -358,11 +508,10 @@ def progress_along_route(
             "total_distance_m": total_distance,
             "api_calls": api_calls,
             "ambiguity_skips": ambiguity_skips,
+            "download_failures": download_failures,
             "file_paths": file_paths,
             "route_completed": pano_count > 1,  # More than just the initial panorama
-            "termination_reason": "max_panos" if pano_count >= config.get("ROUTE_MAX_PANORAMAS", 50) else
-                                "proximity_to_end" if should_terminate_route(current_coord, end_coord, pano_count, ambiguity_skips, config) else
-                                "no_more_candidates"
+            "termination_reason": termination_reason or "no_more_candidates"
         }
         
         logger.info(f"Route collection completed: {pano_count} panoramas, {total_distance:.2f}m total distance")
@@ -372,16 +521,21 @@ def progress_along_route(
         
     except Exception as e:
         logger.error(f"Error in progress_along_route: {str(e)}")
-        # Return partial results
+        # Return partial results, including downloads that were already in flight
+        while pending_downloads:
+            collect_download()
         summary = {
             "panoramas_collected": pano_count,
             "total_distance_m": total_distance,
             "api_calls": api_calls,
             "ambiguity_skips": ambiguity_skips,
+            "download_failures": download_failures,
             "file_paths": file_paths,
             "route_completed": False,
             "error": str(e)
         }
+    finally:
+        download_executor.shutdown()
     return file_paths, metadata_dict, summary
 
 def process_route_request(start_address, end_address, geocode_func, download_func):
@@ -389,8 +543,6 @@ def process_route_request(start_address, end_address, geocode_func, download_fun
     Entry point for route-based panorama collection.
     Orchestrates geocoding, config, and calls progress_along_route.
     """
-    import logging
-    from app.street_heuristics import extract_street_name
     logger = logging.getLogger(__name__)
     try:
         logger.info(f"Processing route: {start_address} to {end_address}")
@@ -402,15 +554,6 @@ def process_route_request(start_address, end_address, geocode_func, download_fun
         logger.info(f"Extracted street name: {start_street}")
         
         # Prepare config dict
-        from app.config import (
-            ROUTE_HEADING_SECTOR_DEGREES,
-            ROUTE_MAX_PANORAMAS,
-            ROUTE_PROXIMITY_THRESHOLD,
-            ROUTE_CONFIDENCE_THRESHOLD,
-            ROUTE_SEARCH_RADIUS,
-            ROUTE_PROGRESSION_THRESHOLD,
-            ROUTE_MAX_AMBIGUOUS_SKIPS
-        )
         config = {
             "ROUTE_HEADING_SECTOR_DEGREES": ROUTE_HEADING_SECTOR_DEGREES,
             "ROUTE_MAX_PANORAMAS": ROUTE_MAX_PANORAMAS,
@@ -418,7 +561,9 @@ def process_route_request(start_address, end_address, geocode_func, download_fun
             "ROUTE_CONFIDENCE_THRESHOLD": ROUTE_CONFIDENCE_THRESHOLD,
             "ROUTE_SEARCH_RADIUS": ROUTE_SEARCH_RADIUS,
             "ROUTE_PROGRESSION_THRESHOLD": ROUTE_PROGRESSION_THRESHOLD,
-            "ROUTE_MAX_AMBIGUOUS_SKIPS": ROUTE_MAX_AMBIGUOUS_SKIPS
+            "ROUTE_MAX_AMBIGUOUS_SKIPS": ROUTE_MAX_AMBIGUOUS_SKIPS,
+            "ROUTE_BACKGROUND_STREET_LOOKUPS": ROUTE_BACKGROUND_STREET_LOOKUPS,
+            "ROUTE_MAX_CANDIDATES": ROUTE_MAX_CANDIDATES
         }
         # Call progress_along_route
         file_paths, metadata_dict, summary = progress_along_route(
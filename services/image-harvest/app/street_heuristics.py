@@ -6,10 +6,18 @@ import re
 from typing import List, Dict, Tuple
 from app.models import Coordinate
 from app.config import ROUTE_PROXIMITY_THRESHOLD, ROUTE_CONFIDENCE_THRESHOLD
-from app.core.utils import calculate_distance
+from app.core.utils import calculate_distance, calculate_distance_fast
 
 logger = logging.getLogger(__name__)
 
+# Leading token of the first address part (house number), then the rest of that part
+_STREET_RE = re.compile(r"\s*[^\s,]+\s*([^,]*)")
+
+_PROGRESSION_POINTS = 2  # awarded by calculate_confidence_score for moving toward the end
+_HEADING_POINTS = 0      # heading alignment is not scored yet (see the TODO in _score_from_proximity)
+# Most points a panorama can still gain after the proximity check
+_MAX_POINTS_AFTER_PROXIMITY = _PROGRESSION_POINTS + _HEADING_POINTS
+
 def extract_street_name(address: str) -> str:
     """
     Extract street name from address without API call.
@@ -19,24 +27,10 @@ def extract_street_name(address: str) -> str:
     "123 Main Street, New York, NY" → "Main Street"
     """
     try:
-        # Remove any extra whitespace
-        address = address.strip()
-        
-        # Split by comma to get address parts
-        parts = [part.strip() for part in address.split(',')]
-        
-        # First part contains the street address
-        street_part = parts[0]
-        
-        # Split by space to separate number from street name
-        street_components = street_part.split()
-        
-        # Skip the first component (house number)
-        # Keep the rest as street name
-        street_name_components = street_components[1:]
-        
-        # Join back together
-        street_name = ' '.join(street_name_components)
+        # One scan of the first comma-separated part: skip the leading token (house number)
+        # and capture the rest, instead of splitting the whole address into lists
+        match = _STREET_RE.match(address)
+        street_name = ' '.join(match.group(1).split()) if match else ""
         
         logger.debug(f"Extracted street name '{street_name}' from address '{address}'")
         return street_name
@@ -66,8 +60,15 @@ def apply_street_heuristics(panoramas: List, start_street: str, current_head_coo
         filtered_panoramas = []
         
         for pano in panoramas:
+            # Panoramas too far from the head to reach the threshold even with every remaining
+            # bonus are rejected on proximity alone, skipping the two distances to the end
+            proximity_points = _proximity_points(pano, current_head_coord)
+            if proximity_points + _MAX_POINTS_AFTER_PROXIMITY < ROUTE_CONFIDENCE_THRESHOLD:
+                logger.debug(f"Panorama at ({pano.lat}, {pano.lon}) rejected on proximity ({proximity_points} points)")
+                continue
+            
             # Calculate confidence score
-            confidence_score = calculate_confidence_score(pano, current_head_coord, end_coord)
+            confidence_score = _score_from_proximity(pano, proximity_points, current_head_coord, end_coord)
             
             # Apply confidence threshold
             if confidence_score >= ROUTE_CONFIDENCE_THRESHOLD:
@@ -95,31 +96,37 @@ def calculate_confidence_score(pano, current_head_coord: Coordinate, end_coord:
     Returns:
         Confidence score (0-10, higher is more confident)
     """
-    score = 0
-    
-    # Proximity check (distance from current head)
-    distance_from_head = calculate_distance(
+    return _score_from_proximity(pano, _proximity_points(pano, current_head_coord), current_head_coord, end_coord)
+
+def _proximity_points(pano, current_head_coord: Coordinate) -> int:
+    """Points for the distance from the current head (short range, so equirectangular)."""
+    distance_from_head = calculate_distance_fast(
         current_head_coord.lat, current_head_coord.lng,
         pano.lat, pano.lon
     )
     
     if distance_from_head < 50:
-        score += 3  # High confidence
+        return 3  # High confidence
     elif distance_from_head < 100:
-        score += 2  # Medium confidence
+        return 2  # Medium confidence
     elif distance_from_head < 150:
-        score += 1  # Low confidence
+        return 1  # Low confidence
+    return 0
+
+def _score_from_proximity(pano, proximity_points: int, current_head_coord: Coordinate, end_coord: Coordinate) -> int:
+    """Add the bonuses after the proximity check (at most _MAX_POINTS_AFTER_PROXIMITY) to its points."""
+    score = proximity_points
     
     # Distance progression check (closer to end)
     distance_to_end = calculate_distance(pano.lat, pano.lon, end_coord.lat, end_coord.lng)
     distance_head_to_end = calculate_distance(current_head_coord.lat, current_head_coord.lng, end_coord.lat, end_coord.lng)
     
     if distance_to_end < distance_head_to_end:
-        score += 2  # Moving toward end
+        score += _PROGRESSION_POINTS  # Moving toward end
     
     # Heading alignment check (if heading available)
     if hasattr(pano, 'heading'):
-        # TODO: Add heading-based scoring in future step
+        # TODO: Add heading-based scoring in future step (up to _HEADING_POINTS)
         pass
     
     return score 
\ No newline at end of file
@@ -0,0 +1,23 @@
+from app.core.boundary_analysis import (
+    determine_search_strategy,
+    select_adaptive_tiles,
+)
+
+def test_corner_strategy_includes_diagonal_tile():
+    boundary_distances = {"north": 10.0, "south": 290.0, "east": 20.0, "west": 200.0, "center_tile": (100, 200)}
+
+    strategy = determine_search_strategy(boundary_distances)
+    tiles = select_adaptive_tiles(strategy, boundary_distances)
+
+    assert strategy == "corner"
+    assert tiles[0] == (100, 200)
+    assert sorted(tiles) == [(100, 199), (100, 200), (101, 199), (101, 200)]
+
+def test_opposite_boundaries_use_multi_direction():
+    boundary_distances = {"north": 10.0, "south": 20.0, "east": 150.0, "west": 150.0, "center_tile": (100, 200)}
+
+    strategy = determine_search_strategy(boundary_distances)
+    tiles = select_adaptive_tiles(strategy, boundary_distances)
+
+    assert strategy == "multi-direction"
+    assert sorted(tiles) == [(100, 199), (100, 200), (100, 201)]
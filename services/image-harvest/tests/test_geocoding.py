@@ -0,0 +1,72 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Bytes produced by the original BinaryWriter-based serializer and field-by-field request builder
+TICKET_REQUEST = b"\x00\x01\x00\x02en\x00\x0ecom.apple.geod\x00\x0e11.7.5.20G1225\x00\x00\x00<\x00\x00\x00\x03abc"
+PB_REQUEST = (
+    b'\x12\x04\xd2\x01\x01\x01\x1a\x05en-US*\x04\x08\x1f\x18\x018\x04B,"*\x18\x01"&\n\x12'
+    b'\t\xb4\xab\x90\xf2\x93\xaaB@\x11\xb8\x1e\x85\xebQ\x80^\xc01\x00\x00\x00\x00\x00\x00\xf0\xbf'
+    b'A\x00\x00\x00\x00\x00\x00\xf0\xbf'
+)
+
+# app.core.geocoding's protos and streetlevel.lookaround's both define streetlevel.CameraMetadata,
+# so they can't share a descriptor pool; the geocoding serializers run in their own interpreter
+SERIALIZE_SCRIPT = """
+import json
+from types import SimpleNamespace
+from app.core import geocoding
+
+sent = []
+def post(url, data):
+    sent.append(data)
+    # version 1, unknown 0, payload length 3, payload, trailing bytes past the length
+    return SimpleNamespace(content=b"\\x00\\x01\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x03xyz!!")
+
+payload = geocoding.make_ticket_request(b"abc", SimpleNamespace(post=post))
+response = geocoding.deserialize_ticket_response(b"\\x00\\x02\\x00\\x00\\x00\\x3c\\x00\\x00\\x00\\x02hi")
+pb_request = geocoding._build_pb_request(37.33264, -122.005, ["en-US"]).SerializeToString()
+geocoding._build_pb_request(1.0, 2.0, ["de-DE"])
+pb_request_again = geocoding._build_pb_request(37.33264, -122.005, ["en-US"]).SerializeToString()
+
+print(json.dumps({
+    "ticket_request": geocoding.serialize_ticket_request(geocoding.TicketRequestHeader(), b"abc").hex(),
+    "sent": [body.hex() for body in sent],
+    "payload": payload.hex(),
+    "response_header": list(response.header),
+    "response_payload": response.payload.hex(),
+    "pb_request": pb_request.hex(),
+    "pb_request_again": pb_request_again.hex(),
+}))
+"""
+
+@pytest.fixture(scope="module")
+def serialized():
+    result = subprocess.run(
+        [sys.executable, "-c", SERIALIZE_SCRIPT],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_serialize_ticket_request_matches_original_bytes(serialized):
+    assert bytes.fromhex(serialized["ticket_request"]) == TICKET_REQUEST
+
+def test_make_ticket_request_sends_original_bytes_and_returns_payload(serialized):
+    assert [bytes.fromhex(body) for body in serialized["sent"]] == [TICKET_REQUEST]
+    assert bytes.fromhex(serialized["payload"]) == b"xyz"
+
+def test_deserialize_ticket_response_reads_header_and_payload(serialized):
+    assert serialized["response_header"] == [2, 60]
+    assert bytes.fromhex(serialized["response_payload"]) == b"hi"
+
+def test_build_pb_request_matches_original_bytes(serialized):
+    assert bytes.fromhex(serialized["pb_request"]) == PB_REQUEST
+
+def test_build_pb_request_does_not_mutate_template(serialized):
+    assert bytes.fromhex(serialized["pb_request_again"]) == PB_REQUEST
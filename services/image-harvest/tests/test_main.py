@@ -1,174 +1,305 @@
+import asyncio
+import importlib
+import json
+import math
+import threading
+import time
+import httpx
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-from app.main import app, Coordinate, LocationRequest, download_lookaround_panorama
+from unittest.mock import patch
+from app.core import nominatim
+from app.models import Coordinate, LocationRequest
 from PIL import Image
 import io
+from types import SimpleNamespace
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 
-client = TestClient(app)
+# Encoded once and written by the fake HEIC converter instead of decoding per face
+_buffer = io.BytesIO()
+Image.new("RGB", (1, 1)).save(_buffer, "JPEG")
+TINY_JPEG = _buffer.getvalue()
+
+NOMINATIM_HIT = SimpleNamespace(status_code=200, content=b'[{"lat": "37.7749", "lon": "-122.4194"}]')
+NOMINATIM_MISS = SimpleNamespace(status_code=200, content=b'[]')
+
+# Request bodies, dumped once at import instead of per test
+REQ_COORDS = LocationRequest(coordinates=Coordinate(lat=37.7749, lng=-122.4194)).model_dump()
+REQ_ADDR = LocationRequest(address="1600 Amphitheatre Parkway, Mountain View, CA").model_dump()
+REQ_BAD_ADDR = LocationRequest(address="Invalid Address That Should Fail").model_dump()
+REQ_EMPTY = LocationRequest().model_dump()
+
+# Response shapes, compiled into validators once instead of checked key by key in each test
+class ImageResult(TypedDict):
+    file_paths: list[str]
+    metadata: dict[str, dict]
+
+validate_image_response = TypeAdapter(ImageResult).validate_python
+
+@pytest.fixture(scope="session")
+def harvest_main():
+    # Imported once per process (per xdist worker), and only when a test in this module runs:
+    # app.main starts log, thread and process pool machinery that other test modules don't need
+    return importlib.import_module("app.main")
+
+@pytest.fixture(scope="session")
+def app(harvest_main):
+    return harvest_main.app
+
+@pytest.fixture(scope="session")
+def download_lookaround_panorama(harvest_main):
+    return harvest_main.download_lookaround_panorama
+
+@pytest.fixture(scope="session")
+def client(app):
+    # Session scope is per process, so each xdist worker builds its own client. Entering it
+    # keeps one event loop portal (and any lifespan) open for all requests instead of per call
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def async_client(app):
+    # One client (and ASGI transport) for the session; independent requests are gathered
+    async_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield async_client
+    asyncio.run(async_client.aclose())
+
+async def call_asgi(app, method, path, body=None):
+    """Call the ASGI app directly, skipping httpx request/response objects.
+
+    Returns:
+        dict: ``status`` and the decoded JSON ``body`` (None if empty).
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "server": ("test", 80),
+        "client": ("testclient", 50000),
+    }
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    response = {"status": None, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    response["body"] = json.loads(response["body"]) if response["body"] else None
+    return response
+
+def _fake_heic_bytes_to_jpeg(heic_data, output_path):
+    with open(output_path, "wb") as f:
+        f.write(TINY_JPEG)
 
 @pytest.fixture
-def mock_streetlevel():
-    with patch('streetlevel.lookaround.get_coverage_tile_by_latlon') as mock_coverage, \
+def fake_conversion(harvest_main, monkeypatch, tmp_path):
+    # Faces convert in a thread pool with a fake decoder and land in a per-test output dir
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        monkeypatch.setattr(harvest_main, "_get_image_pool", lambda: pool)
+        monkeypatch.setattr(harvest_main, "heic_bytes_to_jpeg", _fake_heic_bytes_to_jpeg)
+        monkeypatch.setattr(harvest_main, "OUTPUT_DIR", str(tmp_path))
+        yield tmp_path
+
+@pytest.fixture(scope="module")
+def streetlevel_patches(harvest_main):
+    # Patched once per module (and per xdist worker); mock_streetlevel resets the mocks for each test
+    with patch.object(harvest_main, 'fetch_adaptive_tiles') as mock_tiles, \
          patch('streetlevel.lookaround.get_panorama_face') as mock_face:
-        
-        # Mock coverage tile response
-        mock_pano = MagicMock()
-        mock_pano.id = "123"
-        mock_pano.build_id = "456"
-        mock_pano.lat = 37.7749
-        mock_pano.lon = -122.4194
-        mock_pano.heading = 180
-        mock_pano.elevation = 10
-        mock_pano.date = None
-
-        mock_coverage_tile = MagicMock()
-        mock_coverage_tile.panoramas = [mock_pano]
-        mock_coverage.return_value = mock_coverage_tile
-
-        # Mock panorama face response
-        mock_face.return_value = b"fake_heic_data"
-        
-        yield (mock_coverage, mock_face)
-
-def test_download_lookaround_panorama(mock_streetlevel):
-    mock_coverage, mock_face = mock_streetlevel
+        yield (mock_tiles, mock_face)
+
+@pytest.fixture
+def mock_streetlevel(streetlevel_patches, fake_conversion):
+    mock_tiles, mock_face = streetlevel_patches
+    mock_tiles.reset_mock(return_value=True, side_effect=True)
+    mock_face.reset_mock(return_value=True, side_effect=True)
+    
+    # Mock adaptive tile response; headings are counter-clockwise radians (pi faces south)
+    mock_pano = SimpleNamespace(id="123", build_id="456", lat=37.7749, lon=-122.4194,
+                                heading=math.pi, elevation=10, date=None)
+    mock_tiles.return_value = [SimpleNamespace(panos=[mock_pano])]
+
+    # Mock panorama face response
+    mock_face.return_value = b"fake_heic_data"
+    
+    return (mock_tiles, mock_face)
+
+@pytest.fixture
+def mock_nominatim(harvest_main, fresh_geocoding):
+    with patch.object(nominatim.nominatim_session, "get", return_value=NOMINATIM_HIT) as mock_get:
+        yield mock_get
+
+def test_download_lookaround_panorama(mock_streetlevel, download_lookaround_panorama):
+    mock_tiles, mock_face = mock_streetlevel
     
     # Create a test coordinate
     coord = Coordinate(lat=37.7749, lng=-122.4194)
 
-    # Mock PIL Image operations
-    with patch('PIL.Image.open') as mock_image_open:
-        mock_image = MagicMock()
-        mock_image_open.return_value = mock_image
-
-        # Call the function
-        file_path, metadata = download_lookaround_panorama(coord)
-
-        # Verify the function called the API correctly
-        mock_coverage.assert_called_once_with(37.7749, -122.4194)
-        mock_face.assert_called_once()
-
-        # Verify metadata
-        assert metadata["id"] == "123"
-        assert metadata["build_id"] == "456"
-        assert metadata["coordinates"]["lat"] == 37.7749
-        assert metadata["coordinates"]["lng"] == -122.4194
-        assert metadata["heading"] == 180
-        assert metadata["elevation"] == 10
-        assert metadata["date"] is None
-        assert metadata["source_format"] == "heic"
-        assert metadata["output_format"] == "jpg"
-
-def test_harvest_endpoint(mock_streetlevel):
-    with patch('PIL.Image.open') as mock_image_open:
-        mock_image = MagicMock()
-        mock_image_open.return_value = mock_image
-
-        # Test with coordinates
-        response = client.post(
-            "/harvest",
-            json={"coordinates": {"lat": 37.7749, "lng": -122.4194}}
-        )
-        assert response.status_code == 200
-        assert "file_path" in response.json()
-        assert "metadata" in response.json()
-
-        # Test with address
-        response = client.post(
-            "/harvest",
-            json={"address": "123 Main St"}
-        )
-        assert response.status_code == 200
-        assert "file_path" in response.json()
-        assert "metadata" in response.json()
-
-def test_health_endpoint():
-    response = client.get("/health")
+    # Call the function
+    file_path, metadata = download_lookaround_panorama(coord)
+
+    # Verify the function fetched the tiles once and all 6 faces
+    mock_tiles.assert_called_once()
+    assert mock_face.call_count == 6
+    assert file_path.endswith("_2.jpg")
+    with open(file_path, "rb") as f:
+        assert f.read() == TINY_JPEG
+
+    # Verify metadata
+    assert metadata["id"] == "123"
+    assert metadata["build_id"] == "456"
+    assert metadata["coordinates"]["lat"] == 37.7749
+    assert metadata["coordinates"]["lng"] == -122.4194
+    assert metadata["heading_degrees"] == 180
+    assert metadata["heading_radians"] == math.pi
+    assert metadata["elevation"] == 10
+    assert metadata["date"] is None
+    assert metadata["source_format"] == "heic"
+    assert metadata["output_format"] == "jpg"
+
+def _check_harvest_ok(response):
     assert response.status_code == 200
-    assert response.json() == {"status": "ok"}
+    validate_image_response(response.json())
 
-def test_harvest_with_coordinates(mock_streetlevel):
-    request = LocationRequest(
-        coordinates=Coordinate(lat=37.7749, lng=-122.4194)
+@pytest.mark.asyncio
+async def test_harvest_endpoint(mock_streetlevel, mock_nominatim, async_client):
+    # Test with coordinates and with address, concurrently
+    responses = await asyncio.gather(
+        async_client.post("/harvest", json={"coordinates": {"lat": 37.7749, "lng": -122.4194}}),
+        async_client.post("/harvest", json={"address": "123 Main St"}),
     )
-    response = client.post("/harvest", json=request.model_dump())
+    for response in responses:
+        _check_harvest_ok(response)
+
+@pytest.mark.asyncio
+async def test_health_endpoint(app):
+    response = await call_asgi(app, "GET", "/health")
+    assert response["status"] == 200
+    assert response["body"]["status"] == "healthy"
+    assert "timestamp" in response["body"]
+
+HARVEST_CASES = [
+    ("coordinates", REQ_COORDS, 1),
+    ("address", REQ_ADDR, 1),
+]
+
+@pytest.mark.parametrize("name,request_json,expected_len", HARVEST_CASES, ids=[case[0] for case in HARVEST_CASES])
+def test_harvest_with_location(client, mock_streetlevel, mock_nominatim, name, request_json, expected_len):
+    response = client.post("/harvest", json=request_json)
     assert response.status_code == 200
-    data = response.json()
-    assert "file_paths" in data
-    assert "metadata" in data
-    assert len(data["file_paths"]) == 1
-    assert data["metadata"][data["file_paths"][0]]["source_format"] == "heic"
-    assert data["metadata"][data["file_paths"][0]]["output_format"] == "jpg"
-
-def test_harvest_with_address(mock_streetlevel):
-    with patch('geocoder.osm') as mock_geocoder:
-        # Mock the geocoder response
-        mock_location = Mock()
-        mock_location.ok = True
-        mock_location.lat = 37.7749
-        mock_location.lng = -122.4194
-        mock_geocoder.return_value = mock_location
-        
-        request = LocationRequest(
-            address="1600 Amphitheatre Parkway, Mountain View, CA"
-        )
-        response = client.post("/harvest", json=request.model_dump())
-        assert response.status_code == 200
-        data = response.json()
-        assert "file_paths" in data
-        assert "metadata" in data
-        assert len(data["file_paths"]) == 1
-
-def test_harvest_with_route(mock_streetlevel):
-    with patch('geocoder.osm') as mock_geocoder:
-        # Mock the geocoder response
-        mock_location = Mock()
-        mock_location.ok = True
-        mock_location.lat = 37.7749
-        mock_location.lng = -122.4194
-        mock_geocoder.return_value = mock_location
-        
-        request = LocationRequest(
-            route=[
-                Coordinate(lat=37.7749, lng=-122.4194),
-                "1600 Amphitheatre Parkway, Mountain View, CA"
-            ]
-        )
-        response = client.post("/harvest", json=request.model_dump())
-        assert response.status_code == 200
-        data = response.json()
-        assert "file_paths" in data
-        assert "metadata" in data
-        assert len(data["file_paths"]) == 2
-
-def test_invalid_request():
-    request = LocationRequest()  # Empty request
-    response = client.post("/harvest", json=request.model_dump())
-    assert response.status_code == 400
-    assert "Must provide either coordinates, address, or route" in response.json()["detail"]
-
-def test_geocoding_failure():
-    with patch('geocoder.osm') as mock_geocoder:
-        # Mock geocoding failure
-        mock_location = Mock()
-        mock_location.ok = False
-        mock_geocoder.return_value = mock_location
-        
-        request = LocationRequest(
-            address="Invalid Address That Should Fail"
-        )
-        response = client.post("/harvest", json=request.model_dump())
-        assert response.status_code == 400
-        assert "Could not geocode address" in response.json()["detail"]
-
-def test_no_panoramas_found(mock_streetlevel):
-    # Configure mock to return no panoramas
-    mock_streetlevel.return_value.get_panoramas_by_location.return_value = []
+    data = validate_image_response(response.json())
+    assert len(data["file_paths"]) == expected_len
+    for file_path in data["file_paths"]:
+        assert data["metadata"][file_path]["source_format"] == "heic"
+        assert data["metadata"][file_path]["output_format"] == "jpg"
+
+@pytest.mark.asyncio
+async def test_invalid_request(app):
+    response = await call_asgi(app, "POST", "/harvest", REQ_EMPTY)
+    # /harvest reports every failure, including its own 400, as a 500
+    assert response["status"] == 500
+    assert "Must provide either coordinates or address" in response["body"]["detail"]
+
+def test_geocoding_failure(client, mock_nominatim):
+    # Mock geocoding failure
+    mock_nominatim.return_value = NOMINATIM_MISS
     
-    request = LocationRequest(
-        coordinates=Coordinate(lat=37.7749, lng=-122.4194)
-    )
-    response = client.post("/harvest", json=request.model_dump())
+    response = client.post("/harvest", json=REQ_BAD_ADDR)
+    assert response.status_code == 500
+    assert "Could not geocode address" in response.json()["detail"]
+
+def test_no_panoramas_found(client, mock_streetlevel):
+    # Configure mock to return a tile without panoramas
+    mock_tiles, _ = mock_streetlevel
+    mock_tiles.return_value = [SimpleNamespace(panos=[])]
+    
+    response = client.post("/harvest", json=REQ_COORDS)
     assert response.status_code == 500
-    assert "No panoramas found at this location" in response.json()["detail"] 
\ No newline at end of file
+    assert "No panoramas found at this location" in response.json()["detail"] 
+
+def test_route_downloads_share_the_download_limit(client, harvest_main, monkeypatch):
+    monkeypatch.setattr(harvest_main, "_download_semaphore", asyncio.Semaphore(1))
+    held = []
+
+    def download(coord, session_id=None):
+        held.append(harvest_main._download_semaphore.locked())
+        return "pano.jpg", {"id": "123"}
+
+    def process_route(start_address, end_address, geocode_func, download_func):
+        file_path, meta = download_func(Coordinate(lat=37.7749, lng=-122.4194), "route")
+        return [file_path], {file_path: meta}
+
+    monkeypatch.setattr(harvest_main, "download_lookaround_panorama", download)
+    monkeypatch.setattr(harvest_main, "process_route_request", process_route)
+
+    response = client.post("/harvest/route", json={"start_address": "A St", "end_address": "B St"})
+    assert response.status_code == 200
+    assert response.json()["file_paths"] == ["pano.jpg"]
+    # The download ran while holding the only slot, which is free again afterwards
+    assert held == [True]
+    assert not harvest_main._download_semaphore.locked()
+
+@pytest.fixture
+def fresh_geocoding(harvest_main, monkeypatch):
+    # Empty geocode cache and no rate-limit sleeps, so each test sees its own Nominatim calls
+    monkeypatch.setattr(harvest_main, "_geocode_cache", TTLCache(maxsize=64, ttl=60))
+    monkeypatch.setattr(nominatim, "wait_for_rate_limit", lambda: None)
+
+def _blocking_nominatim(slow_address):
+    """Fake nominatim_session.get that holds lookups of slow_address until released."""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def get(url, params, timeout):
+        calls.append(params["q"])
+        if params["q"] == slow_address:
+            started.set()
+            release.wait(5)
+        return SimpleNamespace(status_code=200, content=b'[{"lat": "1.5", "lon": "2.5"}]')
+
+    return get, started, release, calls
+
+def test_geocode_address_does_not_hold_other_addresses_behind_a_slow_request(harvest_main, fresh_geocoding):
+    get, started, release, calls = _blocking_nominatim("slow st")
+    with patch.object(nominatim.nominatim_session, "get", side_effect=get), \
+         ThreadPoolExecutor(max_workers=2) as executor:
+        slow = executor.submit(harvest_main.geocode_address, "slow st")
+        assert started.wait(5)
+        fast = executor.submit(harvest_main.geocode_address, "fast st")
+        try:
+            # Completes while the slow request is still in flight
+            assert fast.result(timeout=2) == Coordinate(lat=1.5, lng=2.5)
+        finally:
+            release.set()
+        assert slow.result(timeout=5) == Coordinate(lat=1.5, lng=2.5)
+    assert sorted(calls) == ["fast st", "slow st"]
+
+def test_geocode_address_shares_one_request_between_concurrent_misses(harvest_main, fresh_geocoding):
+    get, started, release, calls = _blocking_nominatim("same st")
+    with patch.object(nominatim.nominatim_session, "get", side_effect=get), \
+         ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(harvest_main.geocode_address, "same st")
+        assert started.wait(5)
+        second = executor.submit(harvest_main.geocode_address, "  Same   St ")
+        time.sleep(0.1)  # let the second lookup start waiting on the first
+        release.set()
+        assert first.result(timeout=5) == second.result(timeout=5) == Coordinate(lat=1.5, lng=2.5)
+    assert calls == ["same st"]
+    assert harvest_main._geocode_inflight == {}
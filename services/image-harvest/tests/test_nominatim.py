@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+from app.core import nominatim
+
+def test_wait_for_rate_limit_only_sleeps_for_recent_calls(monkeypatch):
+    clock = [1000.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(nominatim.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(nominatim.time, "sleep", fake_sleep)
+    monkeypatch.setattr(nominatim, "_last_request_ts", float("-inf"))
+
+    nominatim.wait_for_rate_limit()
+    assert sleeps == []
+
+    clock[0] += 0.25
+    nominatim.wait_for_rate_limit()
+    assert sleeps == [pytest.approx(nominatim.NOMINATIM_RATE_LIMIT - 0.25)]
+
+    clock[0] += nominatim.NOMINATIM_RATE_LIMIT + 5
+    nominatim.wait_for_rate_limit()
+    assert len(sleeps) == 1
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = [1000.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(nominatim.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(nominatim.time, "sleep", fake_sleep)
+    monkeypatch.setattr(nominatim, "_last_request_ts", float("-inf"))
+    return clock, sleeps
+
+def _fake_responses(monkeypatch, clock, responses):
+    sent = []
+
+    def get(url, **kwargs):
+        sent.append(clock[0])
+        return responses.pop(0)
+
+    monkeypatch.setattr(nominatim.nominatim_session, "get", get)
+    return sent
+
+def _response(status_code, headers=None):
+    return SimpleNamespace(status_code=status_code, headers=headers or {}, close=lambda: None)
+
+def test_nominatim_get_backs_off_through_the_rate_limiter(monkeypatch, fake_clock):
+    clock, sleeps = fake_clock
+    sent = _fake_responses(monkeypatch, clock, [_response(503), _response(429), _response(200)])
+
+    assert nominatim.nominatim_get("https://nominatim.test/search").status_code == 200
+
+    # The first retry waits a full rate-limit interval, the second twice that
+    assert [t - sent[0] for t in sent] == [0, nominatim.NOMINATIM_RATE_LIMIT, 3 * nominatim.NOMINATIM_RATE_LIMIT]
+    assert len(sleeps) == 2
+
+def test_nominatim_get_honours_retry_after_for_every_caller(monkeypatch, fake_clock):
+    clock, sleeps = fake_clock
+    sent = _fake_responses(monkeypatch, clock, [_response(429, {"Retry-After": "30"}), _response(200)])
+
+    nominatim.nominatim_get("https://nominatim.test/search")
+    assert sent[1] - sent[0] == 30
+
+    # Other lookups still get their own rate-limit slot afterwards
+    nominatim.wait_for_rate_limit()
+    assert clock[0] - sent[1] == nominatim.NOMINATIM_RATE_LIMIT
+
+def test_nominatim_get_returns_the_last_response_when_retries_run_out(monkeypatch, fake_clock):
+    clock, _ = fake_clock
+    responses = [_response(500) for _ in range(nominatim.NOMINATIM_MAX_RETRIES + 1)]
+    last = responses[-1]
+    sent = _fake_responses(monkeypatch, clock, responses)
+
+    assert nominatim.nominatim_get("https://nominatim.test/search") is last
+    assert len(sent) == nominatim.NOMINATIM_MAX_RETRIES + 1
@@ -0,0 +1,131 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from app.core import panorama_discovery
+from app.core.panorama_discovery import (
+    aggregate_panorama_arrays,
+    fetch_adaptive_tiles,
+    rank_panoramas_by_distance,
+)
+from app.core.utils import calculate_distance
+from app.models import Coordinate
+
+TARGET = Coordinate(lat=37.33264, lng=-122.00500)
+
+def make_pano(pano_id, lat, lon):
+    return SimpleNamespace(id=pano_id, lat=lat, lon=lon)
+
+def test_rank_panoramas_by_distance_orders_and_filters():
+    panoramas = [
+        make_pano("far", 37.33300, -122.00500),   # ~40m north
+        make_pano("out", 37.33400, -122.00500),   # ~150m north, beyond max_distance
+        make_pano("near", 37.33270, -122.00500),  # ~7m north
+        make_pano("mid", 37.33264, -122.00530),   # ~27m west
+    ]
+
+    ranked = rank_panoramas_by_distance(panoramas, TARGET, 50)
+
+    assert [pano.id for pano in ranked] == ["near", "mid", "far"]
+    distances = [calculate_distance(TARGET.lat, TARGET.lng, pano.lat, pano.lon) for pano in ranked]
+    assert distances == sorted(distances)
+
+def test_rank_panoramas_by_distance_top_k_matches_full_ranking():
+    panoramas = [
+        make_pano("far", 37.33300, -122.00500),
+        make_pano("near", 37.33270, -122.00500),
+        make_pano("mid", 37.33264, -122.00530),
+        make_pano("tie", 37.33270, -122.00500),
+    ]
+
+    full = rank_panoramas_by_distance(panoramas, TARGET, 50)
+
+    for k in range(1, len(panoramas) + 2):
+        assert rank_panoramas_by_distance(panoramas, TARGET, 50, top_k=k) == full[:k]
+
+def test_rank_panoramas_by_distance_accepts_panorama_arrays():
+    tiles = [
+        SimpleNamespace(panos=[make_pano("far", 37.33300, -122.00500), make_pano("near", 37.33270, -122.00500)]),
+        SimpleNamespace(panos=[make_pano("mid", 37.33264, -122.00530)]),
+    ]
+
+    arrays = aggregate_panorama_arrays(tiles)
+
+    assert arrays.lats.tolist() == [37.33300, 37.33270, 37.33264]
+    assert [pano.id for pano in rank_panoramas_by_distance(arrays, TARGET, 50)] == ["near", "mid", "far"]
+
+def test_rank_panoramas_by_distance_raises_when_none_within_range():
+    panoramas = [make_pano("out", 37.33400, -122.00500)]
+
+    with pytest.raises(Exception, match="No panoramas found within 50 meters"):
+        rank_panoramas_by_distance(panoramas, TARGET, 50)
+
+
+def test_fetch_adaptive_tiles_keeps_order_and_skips_failed_tiles(monkeypatch):
+    def fake_get_coverage_tile(tile_x, tile_y, session=None):
+        if tile_x == 2:
+            raise ConnectionError("boom")
+        panos = [make_pano(f"{tile_x}-{tile_y}", 0.0, 0.0)] if tile_x != 3 else []
+        return SimpleNamespace(x=tile_x, y=tile_y, panos=panos)
+
+    monkeypatch.setattr(panorama_discovery.lookaround, "get_coverage_tile", fake_get_coverage_tile)
+    panorama_discovery._coverage_tile_cache.clear()
+
+    tiles = fetch_adaptive_tiles([(1, 10), (2, 10), (3, 10), (4, 10)])
+
+    assert [(tile.x, tile.y) for tile in tiles] == [(1, 10), (4, 10)]
+
+def test_fetch_adaptive_tiles_serves_repeated_tiles_from_cache(monkeypatch):
+    calls = []
+
+    def fake_get_coverage_tile(tile_x, tile_y, session=None):
+        calls.append((tile_x, tile_y))
+        return SimpleNamespace(x=tile_x, y=tile_y, panos=[make_pano("p", 0.0, 0.0)])
+
+    monkeypatch.setattr(panorama_discovery.lookaround, "get_coverage_tile", fake_get_coverage_tile)
+    panorama_discovery._coverage_tile_cache.clear()
+
+    fetch_adaptive_tiles([(5, 20), (6, 20)])
+    fetch_adaptive_tiles([(6, 20), (7, 20)])
+
+    assert sorted(calls) == [(5, 20), (6, 20), (7, 20)]
+
+def test_concurrent_requests_for_a_tile_share_one_fetch(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def fake_get_coverage_tile(tile_x, tile_y, session=None):
+        calls.append((tile_x, tile_y))
+        release.wait(timeout=5)
+        return SimpleNamespace(x=tile_x, y=tile_y, panos=[make_pano("p", 0.0, 0.0)])
+
+    monkeypatch.setattr(panorama_discovery.lookaround, "get_coverage_tile", fake_get_coverage_tile)
+    panorama_discovery._coverage_tile_cache.clear()
+
+    first, first_hit = panorama_discovery._coverage_tile_future((8, 30))
+    second, second_hit = panorama_discovery._coverage_tile_future((8, 30))
+    release.set()
+
+    assert first is second
+    assert not first_hit and not second_hit
+    assert first.result(timeout=5) is second.result(timeout=5)
+    assert calls == [(8, 30)]
+
+def test_rank_panoramas_by_distance_prefilter_matches_direct_ranking(monkeypatch):
+    panoramas = [make_pano(f"p{i}", 37.33264 + (i % 40) * 0.00005, -122.00500 + (i // 40) * 0.00005) for i in range(400)]
+
+    direct = rank_panoramas_by_distance(panoramas, TARGET, 50)
+    monkeypatch.setattr(panorama_discovery, "_BBOX_PREFILTER_MIN_PANOS", 0)
+
+    assert rank_panoramas_by_distance(panoramas, TARGET, 50) == direct
+
+def test_aggregate_panorama_arrays_reuses_columns_of_the_same_tile():
+    panorama_discovery._coverage_tile_columns.clear()
+    tile = SimpleNamespace(x=7, y=9, panos=[make_pano("a", 37.33270, -122.00500)])
+    other = SimpleNamespace(x=8, y=9, panos=[make_pano("b", 37.33264, -122.00530)])
+
+    first = aggregate_panorama_arrays([tile])
+    assert aggregate_panorama_arrays([tile]) is first
+
+    refetched = SimpleNamespace(x=7, y=9, panos=[make_pano("c", 37.33300, -122.00500)])
+    assert [pano.id for pano in aggregate_panorama_arrays([refetched, other]).panos] == ["c", "b"]
@@ -0,0 +1,189 @@
+import logging
+import math
+from types import SimpleNamespace
+
+from app.models import Coordinate
+from app import route_processor
+from app.route_processor import (
+    apply_street_heuristics_func,
+    find_nearby_panoramas_func,
+    progress_along_route,
+    select_next_panorama_func,
+    should_terminate_route,
+)
+
+logger = logging.getLogger(__name__)
+
+CURRENT = Coordinate(lat=37.33000, lng=-122.00000)
+END = Coordinate(lat=37.34000, lng=-121.99000)
+
+def make_pano(pano_id, lat, lon):
+    return SimpleNamespace(id=pano_id, build_id=1, lat=lat, lon=lon)
+
+def test_select_next_panorama_prefers_close_candidate_that_progresses():
+    candidates = [
+        make_pano("behind", 37.32980, -122.00020),   # close, but away from the end
+        make_pano("far-ahead", 37.33060, -121.99940),  # progresses, but ~85m away
+        make_pano("ahead", 37.33020, -121.99980),    # close and progresses
+    ]
+
+    selected, state = select_next_panorama_func(candidates, CURRENT, None, END, "Main St", {}, {}, logger)
+
+    assert selected.id == "ahead"
+    assert state == {}
+
+def test_find_nearby_panoramas_sorts_unvisited_candidates_within_radius(monkeypatch):
+    tile = SimpleNamespace(x=1, y=2, panos=[
+        make_pano("mid", 37.33060, -122.00000),      # ~67m
+        make_pano("outside", 37.33500, -122.00000),  # ~556m
+        make_pano("visited", 37.33010, -122.00000),  # ~11m
+        make_pano("near", 37.33020, -122.00000),     # ~22m
+    ])
+    monkeypatch.setattr(route_processor, "fetch_adaptive_tiles", lambda selected_tiles: [tile])
+
+    candidates = find_nearby_panoramas_func(CURRENT, 200, {("visited", 1)}, {}, logger)
+
+    assert [pano.id for pano in candidates] == ["near", "mid"]
+
+def test_apply_street_heuristics_prefers_aligned_candidate_then_falls_back():
+    # Headings are counter-clockwise radians; 315° ccw is 45° clockwise (north-east)
+    candidates = [
+        SimpleNamespace(id="behind", lat=37.32990, lon=-122.00010, heading=math.radians(315)),
+        SimpleNamespace(id="misaligned", lat=37.33010, lon=-121.99990, heading=math.radians(135)),
+        SimpleNamespace(id="aligned", lat=37.33020, lon=-121.99980, heading=math.radians(315)),
+    ]
+
+    assert apply_street_heuristics_func(candidates, "Main St", CURRENT, END, 45.0, {}, logger) == [candidates[2]]
+    # Without an aligned match, the close candidate that progresses passes the fallback scoring
+    assert apply_street_heuristics_func(candidates[:2], "Main St", CURRENT, END, 45.0, {}, logger) == [candidates[1]]
+
+def test_should_terminate_route_reports_reason():
+    config = {"ROUTE_PROGRESSION_THRESHOLD": 10, "ROUTE_MAX_PANORAMAS": 5, "ROUTE_MAX_AMBIGUOUS_SKIPS": 2}
+
+    assert should_terminate_route(CURRENT, END, 1, 0, config) is None
+    assert should_terminate_route(CURRENT, END, 5, 0, config) == "max_panos"
+    assert should_terminate_route(CURRENT, END, 1, 3, config) == "ambiguity_skips"
+    assert should_terminate_route(END, END, 1, 0, config) == "proximity_to_end"
+
+def test_progress_along_route_keeps_route_order_and_drops_failed_downloads():
+    route = [make_pano(step, 37.33000 + 0.0002 * step, -122.00000) for step in range(1, 5)]
+    failed_attempts = []
+
+    def download(coord, session_id):
+        if coord.lat == route[1].lat:
+            failed_attempts.append(coord.lat)
+            raise ConnectionError("boom")
+        return f"pano_{coord.lat:.4f}.jpg", {"id": 0, "build_id": 1, "coordinates": {"lat": coord.lat, "lng": coord.lng}}
+
+    def find_nearby(coord, radius, visited, config, log):
+        return [pano for pano in route if pano.lat > coord.lat and (pano.id, pano.build_id) not in visited][:1]
+
+    file_paths, metadata, summary = progress_along_route(
+        CURRENT, END, "Main St", None, download, find_nearby,
+        lambda candidates, *args: candidates, lambda candidates, *args: (candidates[0], {}),
+        {"ROUTE_MAX_PANORAMAS": 50}, logger
+    )
+
+    assert file_paths == ["pano_37.3300.jpg", "pano_37.3302.jpg", "pano_37.3306.jpg", "pano_37.3308.jpg"]
+    # Retried once, then left out while the walk carries on from the failed panorama
+    assert failed_attempts == [route[1].lat, route[1].lat]
+    assert summary["panoramas_collected"] == 4
+    assert summary["download_failures"] == 1
+    assert summary["ambiguity_skips"] == 0
+    assert summary["termination_reason"] == "no_more_candidates"
+
+def test_progress_along_route_does_not_count_download_failures_as_ambiguity_skips(monkeypatch):
+    monkeypatch.setattr(route_processor, "ROUTE_DOWNLOAD_LOOKAHEAD", 0)  # collect each download right away
+    route = [make_pano(step, 37.33000 + 0.0002 * step, -122.00000) for step in range(1, 4)]
+
+    def download(coord, session_id):
+        if coord.lat == route[0].lat:
+            raise ConnectionError("boom")
+        return f"pano_{coord.lat:.4f}.jpg", {"id": 0, "build_id": 1, "coordinates": {"lat": coord.lat, "lng": coord.lng}}
+
+    def find_nearby(coord, radius, visited, config, log):
+        return [pano for pano in route if pano.lat > coord.lat and (pano.id, pano.build_id) not in visited][:1]
+
+    file_paths, metadata, summary = progress_along_route(
+        CURRENT, END, "Main St", None, download, find_nearby,
+        lambda candidates, *args: candidates, lambda candidates, *args: (candidates[0], {}),
+        {"ROUTE_MAX_PANORAMAS": 50, "ROUTE_MAX_AMBIGUOUS_SKIPS": 0}, logger
+    )
+
+    assert file_paths == ["pano_37.3300.jpg", "pano_37.3304.jpg", "pano_37.3306.jpg"]
+    assert summary["download_failures"] == 1
+    assert summary["termination_reason"] == "no_more_candidates"
+
+def test_progress_along_route_retries_a_failed_download_once():
+    route = [make_pano(step, 37.33000 + 0.0002 * step, -122.00000) for step in range(1, 3)]
+    attempts = []
+
+    def download(coord, session_id):
+        attempts.append(coord.lat)
+        if attempts.count(coord.lat) == 1 and coord.lat == route[0].lat:
+            raise ConnectionError("boom")
+        return f"pano_{coord.lat:.4f}.jpg", {"id": 0, "build_id": 1, "coordinates": {"lat": coord.lat, "lng": coord.lng}}
+
+    def find_nearby(coord, radius, visited, config, log):
+        return [pano for pano in route if pano.lat > coord.lat and (pano.id, pano.build_id) not in visited][:1]
+
+    file_paths, metadata, summary = progress_along_route(
+        CURRENT, END, "Main St", None, download, find_nearby,
+        lambda candidates, *args: candidates, lambda candidates, *args: (candidates[0], {}),
+        {"ROUTE_MAX_PANORAMAS": 50}, logger
+    )
+
+    assert file_paths == ["pano_37.3300.jpg", "pano_37.3302.jpg", "pano_37.3304.jpg"]
+    assert attempts.count(route[0].lat) == 2
+    assert summary["download_failures"] == 0
+
+def test_find_nearby_panoramas_keeps_only_the_nearest_candidates(monkeypatch):
+    tile = SimpleNamespace(x=1, y=3, panos=[make_pano(i, 37.33000 + 0.0001 * i, -122.00000) for i in (5, 1, 4, 2, 3)])
+    monkeypatch.setattr(route_processor, "fetch_adaptive_tiles", lambda selected_tiles: [tile])
+
+    candidates = find_nearby_panoramas_func(CURRENT, 200, {(1, 1)}, {"ROUTE_MAX_CANDIDATES": 2}, logger)
+
+    assert [pano.id for pano in candidates] == [2, 3]
+
+def test_select_next_panorama_queues_street_lookups_instead_of_waiting(monkeypatch):
+    def fake_reverse_street_name(lat, lon):
+        street = "Main St" if lon > -121.99985 else "Side St"
+        with route_processor._reverse_street_cache_lock:
+            route_processor._reverse_street_cache[(round(lat, 5), round(lon, 5))] = street
+        return street, True
+
+    monkeypatch.setattr(route_processor, "_reverse_street_name", fake_reverse_street_name)
+    route_processor._reverse_street_cache.clear()
+    # Tied scores; "side" is closer to the end, "main" is on the start street
+    candidates = [make_pano("main", 37.33020, -121.99980), make_pano("side", 37.33030, -121.99990)]
+
+    config = {"ROUTE_BACKGROUND_STREET_LOOKUPS": True}
+
+    # While the lookups are pending, the best-scored candidate is taken without the street check
+    selected, state = select_next_panorama_func(candidates, CURRENT, None, END, "Main St", {}, config, logger)
+    assert selected.id == "side"
+    assert state["api_calls"] == 2
+
+    route_processor._street_lookup_executor.submit(lambda: None).result(timeout=5)  # drain the queue
+
+    selected, state = select_next_panorama_func(candidates, CURRENT, None, END, "Main St", state, config, logger)
+    assert selected.id == "main"
+    assert state["api_calls"] == 2
+
+def test_select_next_panorama_waits_for_street_lookups_by_default(monkeypatch):
+    calls = []
+
+    def fake_reverse_street_name(lat, lon):
+        calls.append((lat, lon))
+        return ("Main St" if lon > -121.99985 else "Side St"), True
+
+    monkeypatch.setattr(route_processor, "_reverse_street_name", fake_reverse_street_name)
+    # Tied scores; "side" is closer to the end, "main" is on the start street
+    candidates = [make_pano("main", 37.33020, -121.99980), make_pano("side", 37.33030, -121.99990)]
+
+    selected, state = select_next_panorama_func(candidates, CURRENT, None, END, "Main St", {}, {}, logger)
+
+    # The street check decides the very first ambiguous pick
+    assert selected.id == "main"
+    assert state["api_calls"] == 2
+    assert calls == [(37.33030, -121.99990), (37.33020, -121.99980)]
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from app.models import Coordinate
+from app import street_heuristics
+from app.street_heuristics import apply_street_heuristics, calculate_confidence_score, extract_street_name
+
+CURRENT = Coordinate(lat=37.33000, lng=-122.00000)
+END = Coordinate(lat=37.34000, lng=-121.99000)
+
+def test_apply_street_heuristics_keeps_close_progressing_panoramas():
+    close_ahead = SimpleNamespace(lat=37.33020, lon=-121.99980)   # ~28m, progresses
+    close_behind = SimpleNamespace(lat=37.32980, lon=-122.00020)  # ~28m, moves away
+    far_ahead = SimpleNamespace(lat=37.33200, lon=-121.99800)     # ~280m, progresses
+
+    assert apply_street_heuristics([close_ahead, close_behind, far_ahead], "Main St", CURRENT, END) == [close_ahead]
+
+def test_calculate_confidence_score_returns_the_full_score_for_distant_panoramas():
+    far_ahead = SimpleNamespace(lat=37.33200, lon=-121.99800)  # no proximity points, progresses
+
+    assert calculate_confidence_score(far_ahead, CURRENT, END) == 2
+
+def test_apply_street_heuristics_rejects_distant_panoramas_on_proximity_alone(monkeypatch):
+    far_ahead = SimpleNamespace(lat=37.33200, lon=-121.99800)
+    calls = []
+    monkeypatch.setattr(street_heuristics, "calculate_distance", lambda *args: calls.append(args))
+
+    assert apply_street_heuristics([far_ahead], "Main St", CURRENT, END) == []
+    assert calls == []
+
+def test_extract_street_name_drops_house_number_and_locality():
+    assert extract_street_name("1001 Lombard St, San Francisco, CA") == "Lombard St"
+    assert extract_street_name("  10600  N Tantau   Ave , Cupertino, CA 95014") == "N Tantau Ave"
+    assert extract_street_name("123, Main Street") == ""
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from app.core.utils import (
+    calculate_distance,
+    calculate_distance_from_precomputed,
+    calculate_distance_fast,
+    calculate_distance_vector,
+    calculate_distance_vector_fast,
+    precompute_origin,
+)
+
+ORIGIN = (37.33264, -122.00500)
+POINTS = [(37.33270, -122.00500), (37.33264, -122.00530), (37.34000, -121.99000), (37.33264, -122.00500)]
+
+def test_calculate_distance_from_precomputed_matches_calculate_distance():
+    origin = precompute_origin(*ORIGIN)
+
+    for lat, lon in POINTS:
+        assert calculate_distance_from_precomputed(*origin, lat, lon) == pytest.approx(
+            calculate_distance(lat, lon, *ORIGIN), abs=1e-6)
+
+def test_calculate_distance_vector_matches_scalar():
+    lats = np.array([lat for lat, _ in POINTS])
+    lons = np.array([lon for _, lon in POINTS])
+
+    expected = [calculate_distance(*ORIGIN, lat, lon) for lat, lon in POINTS]
+    assert calculate_distance_vector(*ORIGIN, lats, lons) == pytest.approx(expected, abs=1e-6)
+
+def test_calculate_distance_vector_fast_matches_haversine_at_short_range():
+    lats = np.array([lat for lat, _ in POINTS])
+    lons = np.array([lon for _, lon in POINTS])
+
+    expected = [calculate_distance(*ORIGIN, lat, lon) for lat, lon in POINTS]
+    fast = calculate_distance_vector_fast(*ORIGIN, lats, lons)
+    assert fast == pytest.approx(expected, abs=0.01)
+    assert fast == pytest.approx([calculate_distance_fast(*ORIGIN, lat, lon) for lat, lon in POINTS], abs=1e-6)